@@ -0,0 +1,33 @@
+import re
+import unicodedata
+
+# Verhogen bij elke wijziging die andere tokens oplevert: een BM25-index
+# met een andere versie wordt bij het bouwen niet incrementeel hergebruikt.
+ANALYZER_VERSION = 1
+
+# Veelvoorkomende Nederlandse functiewoorden; dragen niets bij aan BM25 maar
+# maken de index (en elke query-som) groter.
+STOPWORDS = frozenset("""
+de het een en of van in op te aan met voor door bij als dat die dit deze is zijn wordt worden
+er om tot naar uit over ook niet geen dan maar nog wel zo al hun haar hij zij ze we wij je u
+ik men kan kunnen moet moeten mag mogen zal zullen is was waren heeft hebben had wordt werd
+""".split())
+
+_COMBINING = re.compile(r"[̀-ͯ]")
+# Apostrof binnen een woord (auto's, pgs'en) valt weg i.p.v. het woord te splitsen
+_APOSTROPHE = re.compile(r"(?<=\w)['’‘`](?=\w)")
+# Getallen met punten/komma's (7.5.3, 2,5) blijven één token; verder alleen letters/cijfers
+_TOKEN = re.compile(r"\d+(?:[.,]\d+)+|[^\W_]+")
+
+
+def normalize(text):
+    """Kleine letters, diacrieten weg (één → een, geïnstalleerd → geinstalleerd), ĳ → ij."""
+    text = (text or "").casefold()
+    if not text.isascii():
+        text = _COMBINING.sub("", unicodedata.normalize("NFKD", text))
+    return _APOSTROPHE.sub("", text)
+
+
+def analyze(text):
+    """Tokens voor BM25, gedeeld door bouwen en zoeken: genormaliseerd, zonder leestekens en stopwoorden."""
+    return [tok for tok in _TOKEN.findall(normalize(text)) if tok not in STOPWORDS]
@@ -0,0 +1,233 @@
+import json
+import time
+import numpy as np
+import faiss
+from parameters import (
+    INDEX_INFO_FILE, IVF_NLIST, IVF_NPROBE, PQ_M, PQ_NBITS,
+    HNSW_M, HNSW_EF_CONSTRUCTION, HNSW_EF_SEARCH, INDEX_STORAGE, INDEX_MMAP,
+    INDEX_REDUCE, INDEX_REDUCE_DIM,
+)
+
+# flat-l2 is het oude (V2/V3) index-type; de vectoren zijn genormaliseerd,
+# dus alle andere types gebruiken inner product (= cosine similarity).
+INDEX_TYPES = ("flat-l2", "flat-ip", "ivf-flat", "ivf-pq", "hnsw")
+
+# Vector-opslag; float16/sq8 alleen voor de types die volledige vectoren bewaren
+STORAGE_TYPES = {
+    "float32": None,
+    "float16": faiss.ScalarQuantizer.QT_fp16,
+    "sq8": faiss.ScalarQuantizer.QT_8bit,
+}
+SQ_INDEX_TYPES = ("flat-ip", "ivf-flat", "hnsw")
+
+# Dimensiereductie vóór de index (zie INDEX_REDUCE)
+REDUCE_METHODS = ("pca", "truncate")
+
+
+def ivf_nlist(n_vectors):
+    """Aantal IVF-clusters: IVF_NLIST, of ~4*sqrt(n) met genoeg trainingspunten per cluster."""
+    nlist = IVF_NLIST or int(4 * np.sqrt(n_vectors))
+    return max(1, min(nlist, n_vectors // 39))
+
+
+def pq_m(dim):
+    """Grootste aantal PQ-subquantizers <= PQ_M waar dim door deelbaar is."""
+    return max(m for m in range(1, min(PQ_M, dim) + 1) if dim % m == 0)
+
+
+def make_index(index_type, dim, n_vectors, storage=INDEX_STORAGE, reduce=INDEX_REDUCE, reduce_dim=INDEX_REDUCE_DIM):
+    """
+    Maak een lege FAISS index van het gekozen type en opslag (parameters uit
+    parameters.py). Met `reduce` worden vectoren en queries eerst naar
+    `reduce_dim` dimensies geprojecteerd en opnieuw genormaliseerd; de index
+    verwacht dan nog steeds vectoren van `dim` dimensies (en moet getraind worden).
+    """
+    if reduce:
+        if reduce not in REDUCE_METHODS:
+            raise ValueError(f"Unknown reduce method: {reduce}")
+        if not 0 < reduce_dim < dim:
+            raise ValueError(f"reduce_dim must be between 1 and {dim - 1}, got {reduce_dim}")
+        if index_type == "flat-l2":
+            raise ValueError("Dimension reduction is not supported for flat-l2")
+        if reduce == "pca":
+            projection = faiss.PCAMatrix(dim, reduce_dim)
+        else:
+            projection = faiss.RemapDimensionsTransform(dim, reduce_dim, False)
+        index = faiss.IndexPreTransform(faiss.NormalizationTransform(reduce_dim, 2.0),
+                                        make_index(index_type, reduce_dim, n_vectors, storage=storage, reduce=None))
+        index.prepend_transform(projection)
+        return index
+
+    ip = faiss.METRIC_INNER_PRODUCT
+    if storage not in STORAGE_TYPES:
+        raise ValueError(f"Unknown storage: {storage}")
+    qtype = STORAGE_TYPES[storage]
+    if qtype is not None:
+        if index_type not in SQ_INDEX_TYPES:
+            raise ValueError(f"Storage {storage} is only supported for {', '.join(SQ_INDEX_TYPES)}")
+        if index_type == "flat-ip":
+            return faiss.IndexScalarQuantizer(dim, qtype, ip)
+        if index_type == "ivf-flat":
+            return faiss.IndexIVFScalarQuantizer(faiss.IndexFlatIP(dim), dim, ivf_nlist(n_vectors), qtype, ip)
+        index = faiss.IndexHNSWSQ(dim, qtype, HNSW_M, ip)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        return index
+    if index_type == "flat-l2":
+        return faiss.IndexFlatL2(dim)
+    if index_type == "flat-ip":
+        return faiss.IndexFlatIP(dim)
+    if index_type == "ivf-flat":
+        return faiss.IndexIVFFlat(faiss.IndexFlatIP(dim), dim, ivf_nlist(n_vectors), ip)
+    if index_type == "ivf-pq":
+        return faiss.IndexIVFPQ(faiss.IndexFlatIP(dim), dim, ivf_nlist(n_vectors), pq_m(dim), PQ_NBITS, ip)
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, HNSW_M, ip)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        return index
+    raise ValueError(f"Unknown index type: {index_type}")
+
+
+def build_ann_index(index_type, embs, previous=None, storage=INDEX_STORAGE,
+                    reduce=INDEX_REDUCE, reduce_dim=INDEX_REDUCE_DIM):
+    """
+    Train (indien nodig) en vul een index met de corpus-vectoren. Met
+    `previous` (de index van de vorige build, zelfde type, opslag en
+    reductie) wordt de training (IVF-clusters / PQ-codeboeken / SQ-bereik /
+    PCA) hergebruikt en alleen opnieuw gevuld.
+    """
+    if previous is not None and previous.is_trained and not isinstance(base_index(previous), faiss.IndexHNSW):
+        index = previous
+        index.reset()
+    else:
+        index = make_index(index_type, embs.shape[1], len(embs), storage=storage, reduce=reduce, reduce_dim=reduce_dim)
+    if not index.is_trained:
+        index.train(embs)
+    index.add(embs)
+    configure_index(index, index_info(index_type, index))
+    return index
+
+
+def index_info(index_type, index, storage=INDEX_STORAGE, **extra):
+    """Metadata die naast de index wordt opgeslagen (INDEX_INFO_FILE)."""
+    info = {
+        "index_type": index_type,
+        "storage": storage,
+        "metric": "l2" if index.metric_type == faiss.METRIC_L2 else "ip",
+        "dim": index.d,
+        "ntotal": index.ntotal,
+    }
+    inner = base_index(index)
+    if inner is not index:
+        projection = faiss.downcast_VectorTransform(index.chain.at(0))
+        info.update(reduce="pca" if isinstance(projection, faiss.PCAMatrix) else "truncate", reduce_dim=inner.d)
+    if index_type.startswith("ivf"):
+        info.update(nlist=faiss.extract_index_ivf(index).nlist, nprobe=IVF_NPROBE)
+    if index_type == "ivf-pq":
+        info.update(pq_m=pq_m(inner.d), pq_nbits=PQ_NBITS)
+    if index_type == "hnsw":
+        info.update(hnsw_m=HNSW_M, ef_construction=HNSW_EF_CONSTRUCTION, ef_search=HNSW_EF_SEARCH)
+    info.update(extra)
+    return info
+
+
+def save_index_info(info, path=INDEX_INFO_FILE):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(info, f, ensure_ascii=False, indent=2)
+
+
+def load_index_info(path=INDEX_INFO_FILE):
+    """Metadata van de index; builds van vóór INDEX_INFO_FILE zijn flat-l2."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"index_type": "flat-l2", "metric": "l2"}
+
+
+def load_index(path, info, mmap=INDEX_MMAP):
+    """
+    Lees de index; met mmap read-only gemapt i.p.v. gekopieerd, zodat
+    meerdere app-processen op één host dezelfde page cache delen en het
+    starten de vectoren niet inleest.
+    """
+    if mmap:
+        flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+        index = faiss.read_index(path, flags)
+    else:
+        index = faiss.read_index(path)
+    configure_index(index, info)
+    return index
+
+
+def base_index(index):
+    """De eigenlijke index achter een eventuele projectie (IndexPreTransform)."""
+    if isinstance(index, faiss.IndexPreTransform):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def reconstructs_exactly(index):
+    """
+    Of index.reconstruct de oorspronkelijke vectoren teruggeeft: alleen bij
+    een flat index. IVF heeft daar een direct map voor nodig, PQ/SQ geven
+    benaderingen en een PCA/truncatie geeft een projectie terug.
+    """
+    return isinstance(index, faiss.IndexFlat)
+
+
+def configure_index(index, info):
+    """Zet de zoekparameters (nprobe / efSearch) die bij het index-type horen."""
+    if "nprobe" in info:
+        faiss.extract_index_ivf(index).nprobe = info["nprobe"]
+    if "ef_search" in info:
+        base_index(index).hnsw.efSearch = info["ef_search"]
+
+
+def search_params(index, sel):
+    """SearchParameters met een IDSelector, van het type dat de index verwacht."""
+    if isinstance(index, faiss.IndexPreTransform):
+        inner = search_params(base_index(index), sel)
+        params = faiss.SearchParametersPreTransform()
+        params.index_params = inner
+        params.referenced_objects = [inner]   # SWIG houdt de binnenste parameters niet zelf vast
+        return params
+    if isinstance(index, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=sel, nprobe=index.nprobe)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=sel, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=sel)
+
+
+# -------------------------------
+# Evaluatie: recall@k en latency t.o.v. exacte zoekactie
+# -------------------------------
+def _latencies_ms(index, queries, k):
+    lat = []
+    for q in queries:
+        t0 = time.perf_counter()
+        index.search(q[None, :], k)
+        lat.append((time.perf_counter() - t0) * 1000)
+    return np.percentile(lat, [50, 95])
+
+
+def evaluate_index(index, embs, k=10, n_queries=200, seed=0):
+    """
+    Recall@k van `index` t.o.v. een exacte float32 IndexFlatIP op dezelfde
+    vectoren (1 - recall = verlies door ANN, float16/sq8 en/of PCA), plus p50/p95
+    latency (ms) per query voor beide. Als queries dienen willekeurige
+    corpus-vectoren.
+    """
+    rng = np.random.default_rng(seed)
+    queries = embs[rng.choice(len(embs), size=min(n_queries, len(embs)), replace=False)]
+    k = min(k, len(embs))
+
+    exact = faiss.IndexFlatIP(embs.shape[1])
+    exact.add(embs)
+    _, I_exact = exact.search(queries, k)
+    _, I = index.search(queries, k)
+    recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(I, I_exact)])
+
+    p50, p95 = _latencies_ms(index, queries, k)
+    e50, e95 = _latencies_ms(exact, queries, k)
+    return {"k": k, "recall": float(recall), "p50_ms": float(p50), "p95_ms": float(p95),
+            "exact_p50_ms": float(e50), "exact_p95_ms": float(e95)}
@@ -0,0 +1,224 @@
+import numpy as np
+from scipy import sparse
+from parameters import BM25_K1, BM25_B, BM25_EPSILON
+from RAG.utils import top_k_indices, pack_strings, unpack_strings
+from RAG.analyzer import analyze, ANALYZER_VERSION
+
+
+def whitespace_tokenize(text: str):
+    """Tokenisatie van de oude rank_bm25 index (split op whitespace); alleen nog voor oude bm25.npz-bestanden."""
+    return (text or "").split()
+
+
+# analyzer-versie (opgeslagen in bm25.npz) → tokenizer; 0 = bestanden van vóór RAG/analyzer
+TOKENIZERS = {0: whitespace_tokenize, ANALYZER_VERSION: analyze}
+
+
+class BM25Index:
+    """
+    BM25 (Okapi) als sparse matrix-product.
+
+    Bij het bouwen worden term-frequenties (doc x term), documentlengtes en
+    IDF één keer berekend en binair opgeslagen (.npz). Bij het laden worden de
+    BM25-gewichten per (doc, term) vooraf uitgerekend, zodat een query alleen
+    nog de kolommen van zijn eigen termen optelt. Scores zijn gelijk aan
+    rank_bm25.BM25Okapi met dezelfde k1/b/epsilon en tokens.
+
+    Documenten en queries gaan door dezelfde analyzer (RAG/analyzer.py);
+    de versie wordt meebewaard zodat een query altijd zo getokeniseerd wordt
+    als de index waarmee hij gebouwd is.
+    """
+
+    def __init__(self, ids, vocab, tf, doc_len, idf, k1=BM25_K1, b=BM25_B, analyzer=ANALYZER_VERSION):
+        if analyzer not in TOKENIZERS:
+            raise ValueError(f"BM25-index met onbekende analyzer-versie {analyzer}; draai build_index.py --mode bm25 --full")
+        self.ids = list(ids)
+        self.vocab = list(vocab)
+        self.term_to_id = {t: i for i, t in enumerate(self.vocab)}
+        self.tf = tf.tocsr()
+        self.doc_len = np.asarray(doc_len, dtype="float32")
+        self.idf = np.asarray(idf, dtype="float32")
+        self.k1, self.b = k1, b
+        self.analyzer = analyzer
+        self.tokenize = TOKENIZERS[analyzer]
+        self.weights = self._weights()
+
+    # -------------------------------
+    # Bouwen
+    # -------------------------------
+    @classmethod
+    def build(cls, ids, texts, k1=BM25_K1, b=BM25_B, epsilon=BM25_EPSILON):
+        term_to_id = {}
+        tf, doc_len = _term_counts(texts, term_to_id)
+        return cls(ids, list(term_to_id), tf, doc_len, compute_idf(tf, epsilon), k1, b)
+
+    def update(self, ids, texts, reuse, epsilon=BM25_EPSILON):
+        """
+        Nieuwe BM25Index voor `texts` op basis van deze index: rijen met
+        reuse[i] >= 0 nemen de term-frequenties van rij reuse[i] over, alleen
+        nieuwe/gewijzigde teksten worden getokeniseerd. De vocabulaire groeit
+        alleen aan; df/idf en documentlengtes worden uit de tf-matrix herberekend.
+        Kan alleen met een index van de huidige analyzer-versie.
+        """
+        if self.analyzer != ANALYZER_VERSION:
+            raise ValueError("BM25-index met een oudere analyzer kan niet incrementeel bijgewerkt worden")
+        reuse = np.asarray(reuse, dtype="int64")
+        kept, fresh = np.flatnonzero(reuse >= 0), np.flatnonzero(reuse < 0)
+
+        term_to_id = dict(self.term_to_id)
+        tf_fresh, len_fresh = _term_counts([texts[i] for i in fresh], term_to_id)
+        old = self.tf[reuse[kept]]
+        tf_kept = sparse.csr_matrix((old.data, old.indices, old.indptr), shape=(len(kept), len(term_to_id)))
+
+        # Rijen terug in de volgorde van `texts`
+        stacked = sparse.vstack([tf_kept, tf_fresh]).tocsr()
+        position = np.empty(len(reuse), dtype="int64")
+        position[np.concatenate([kept, fresh])] = np.arange(len(reuse))
+        tf = stacked[position]
+
+        doc_len = np.empty(len(reuse), dtype="float32")
+        doc_len[kept] = self.doc_len[reuse[kept]]
+        doc_len[fresh] = len_fresh
+        return BM25Index(ids, list(term_to_id), tf, doc_len, compute_idf(tf, epsilon), self.k1, self.b)
+
+    def _weights(self):
+        """Per (doc, term): idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl))."""
+        tf = self.tf.tocoo()
+        avgdl = self.doc_len.mean() if len(self.doc_len) else 0.0
+        norm = self.k1 * (1 - self.b + self.b * self.doc_len / max(avgdl, 1e-9))
+        data = self.idf[tf.col] * tf.data * (self.k1 + 1) / (tf.data + norm[tf.row])
+        # CSC: kolom-slicing per query-term is dan goedkoop
+        return sparse.csc_matrix((data.astype("float32"), (tf.row, tf.col)), shape=tf.shape)
+
+    # -------------------------------
+    # Opslaan / laden
+    # -------------------------------
+    def save(self, path):
+        tf = self.tf
+        np.savez(
+            path,
+            ids=pack_strings(self.ids),
+            vocab=pack_strings(self.vocab),
+            tf_data=tf.data, tf_indices=tf.indices, tf_indptr=tf.indptr,
+            shape=np.array(tf.shape, dtype="int64"),
+            doc_len=self.doc_len,
+            idf=self.idf,
+            params=np.array([self.k1, self.b], dtype="float64"),
+            analyzer=np.array(self.analyzer, dtype="int64"),
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as z:
+            tf = sparse.csr_matrix((z["tf_data"], z["tf_indices"], z["tf_indptr"]), shape=tuple(z["shape"]))
+            k1, b = z["params"]
+            analyzer = int(z["analyzer"]) if "analyzer" in z.files else 0
+            return cls(unpack_strings(z["ids"]), unpack_strings(z["vocab"]), tf, z["doc_len"], z["idf"],
+                       float(k1), float(b), analyzer)
+
+    # -------------------------------
+    # Zoeken
+    # -------------------------------
+    def query_terms(self, query):
+        """Gesorteerde term-ids + aantallen van de query (onbekende termen tellen niet mee)."""
+        counts = {}
+        for tok in self.tokenize(query):
+            tid = self.term_to_id.get(tok)
+            if tid is not None:
+                counts[tid] = counts.get(tid, 0) + 1
+        term_ids = np.array(sorted(counts), dtype="int64")
+        return term_ids, np.array([counts[t] for t in term_ids], dtype="float32")
+
+    def get_scores_batch(self, queries):
+        """
+        BM25-scores (doc x query, dense) voor een lijst queries in één product:
+        de kolommen van alle query-termen maal een kleine (term x query) matrix.
+        Termen staan gesorteerd, dus een query krijgt dezelfde scores als los.
+        """
+        per_query = [self.query_terms(q) for q in queries]
+        terms = np.unique(np.concatenate([t for t, _ in per_query] + [np.empty(0, dtype="int64")]))
+        if len(terms) == 0:
+            return np.zeros((len(self.ids), len(queries)), dtype="float32")
+        q_mat = np.zeros((len(terms), len(queries)), dtype="float32")
+        for j, (term_ids, counts) in enumerate(per_query):
+            q_mat[np.searchsorted(terms, term_ids), j] = counts
+        return np.asarray(self.weights[:, terms] @ q_mat)
+
+    def get_scores(self, query):
+        """BM25-score voor elk document (dense array, rijvolgorde = self.ids)."""
+        return self.get_scores_batch([query])[:, 0]
+
+    def top_k_batch(self, queries, k, rows=None, block=256):
+        """Rijnummers en scores van de k beste documenten per query (optioneel alleen binnen `rows`)."""
+        results = []
+        for start in range(0, len(queries), block):
+            scores = self.get_scores_batch(queries[start:start + block])
+            if rows is not None:
+                scores = scores[rows]
+            for j in range(scores.shape[1]):
+                top = top_k_indices(scores[:, j], k)
+                results.append((top if rows is None else rows[top], scores[top, j]))
+        return results
+
+    def top_k(self, query, k, rows=None):
+        """Rijnummers en scores van de k beste documenten (optioneel alleen binnen `rows`)."""
+        return self.top_k_batch([query], k, rows=rows)[0]
+
+
+class BM25Builder:
+    """
+    Bouwt een BM25Index batch voor batch (streaming build): alleen de sparse
+    tf-matrix groeit mee, de teksten zelf worden niet bewaard. Geeft dezelfde
+    index als BM25Index.build over alle teksten achter elkaar.
+    """
+
+    def __init__(self):
+        self.term_to_id = {}
+        self._parts = []
+        self._doc_len = []
+
+    def add(self, texts):
+        tf, doc_len = _term_counts(texts, self.term_to_id)
+        self._parts.append(tf)
+        self._doc_len.append(doc_len)
+
+    def finish(self, ids, k1=BM25_K1, b=BM25_B, epsilon=BM25_EPSILON):
+        n_terms = len(self.term_to_id)
+        # Eerdere batches kenden minder termen: kolommen aanvullen tot de volledige vocabulaire
+        parts = [sparse.csr_matrix((p.data, p.indices, p.indptr), shape=(p.shape[0], n_terms)) for p in self._parts]
+        tf = sparse.vstack(parts).tocsr() if parts else sparse.csr_matrix((0, n_terms), dtype="float32")
+        doc_len = np.concatenate(self._doc_len) if self._doc_len else np.empty(0, dtype="float32")
+        return BM25Index(ids, list(self.term_to_id), tf, doc_len, compute_idf(tf, epsilon), k1, b)
+
+
+def _term_counts(texts, term_to_id):
+    """Tokeniseer teksten → sparse tf-matrix (doc x term) + documentlengtes; nieuwe termen komen in term_to_id."""
+    rows, cols, vals, doc_len = [], [], [], []
+    for row, text in enumerate(texts):
+        tokens = analyze(text)
+        doc_len.append(len(tokens))
+        counts = {}
+        for tok in tokens:
+            tid = term_to_id.setdefault(tok, len(term_to_id))
+            counts[tid] = counts.get(tid, 0) + 1
+        rows.extend([row] * len(counts))
+        cols.extend(counts.keys())
+        vals.extend(counts.values())
+
+    tf = sparse.csr_matrix(
+        (np.asarray(vals, dtype="float32"), (np.asarray(rows, dtype="int64"), np.asarray(cols, dtype="int64"))),
+        shape=(len(doc_len), len(term_to_id)),
+    )
+    return tf, np.asarray(doc_len, dtype="float32")
+
+
+def compute_idf(tf, epsilon=BM25_EPSILON):
+    """IDF zoals rank_bm25.BM25Okapi: negatieve waarden → epsilon * gemiddelde idf."""
+    n_docs = tf.shape[0]
+    df = np.bincount(tf.tocsr().indices, minlength=tf.shape[1]).astype("float64")
+    idf = np.log(n_docs - df + 0.5) - np.log(df + 0.5)
+    present = df > 0   # na een incrementele update kunnen er termen zonder documenten in de vocabulaire staan
+    if present.any():
+        idf[idf < 0] = epsilon * idf[present].mean()
+    return idf.astype("float32")
+
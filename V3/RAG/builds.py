@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from parameters import (
+    VERSION, BUILDS_DIR, CURRENT_BUILD_FILE, BUILD_KEEP,
+    FAISS_INDEX_FILE, INDEX_INFO_FILE, EMBEDDINGS_FILE, BM25_FILE, DOCSTORE_FILE, ALIASES_FILE, CHUNK_MANIFEST_FILE,
+)
+
+# Bestandsnamen binnen een build-map (zelfde namen als de oude losse bestanden in VERSION/)
+ARTIFACTS = {
+    "index": os.path.basename(FAISS_INDEX_FILE),
+    "index_info": os.path.basename(INDEX_INFO_FILE),
+    "embeddings": os.path.basename(EMBEDDINGS_FILE),
+    "bm25": os.path.basename(BM25_FILE),
+    "docstore": os.path.basename(DOCSTORE_FILE),
+    "aliases": os.path.basename(ALIASES_FILE),
+    "chunks": os.path.basename(CHUNK_MANIFEST_FILE),
+}
+MANIFEST_NAME = "manifest.json"
+
+
+def artifact(build_dir, name):
+    return os.path.join(build_dir, ARTIFACTS[name])
+
+
+def current_build_dir():
+    """
+    Map van de gepubliceerde build (uit CURRENT_BUILD_FILE). Zonder pointer
+    is het de oude indeling met de bestanden direct in VERSION/.
+    """
+    try:
+        with open(CURRENT_BUILD_FILE, encoding="utf-8") as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return VERSION
+    return os.path.join(BUILDS_DIR, name) if name else VERSION
+
+
+def new_build_dir():
+    """Lege map voor een nieuwe build (naam = bouwtijd, uniek per proces)."""
+    path = os.path.join(BUILDS_DIR, time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}")
+    os.makedirs(path)
+    return path
+
+
+def carry_over(src_dir, dst_dir, names):
+    """Neem ongewijzigde artefacten van de vorige build over (hardlink, anders kopie)."""
+    for name in names:
+        src, dst = artifact(src_dir, name), artifact(dst_dir, name)
+        if not os.path.exists(src):
+            raise FileNotFoundError(f"{src} ontbreekt in de vorige build; bouw alles opnieuw (--mode all)")
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
+
+
+def file_sha256(path, block=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(block), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def write_manifest(build_dir, model, rows, **extra):
+    """
+    manifest.json van een build: checksum, grootte en rijen per artefact,
+    plus model en bouwtijd. `rows`: aantal rijen per artefact-naam.
+    """
+    artifacts = {}
+    for name, filename in ARTIFACTS.items():
+        path = os.path.join(build_dir, filename)
+        if os.path.exists(path):
+            artifacts[name] = {"file": filename, "bytes": os.path.getsize(path),
+                               "sha256": file_sha256(path), "rows": rows.get(name)}
+    manifest = {
+        "build_id": os.path.basename(os.path.normpath(build_dir)),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "model": model,
+        "artifacts": artifacts,
+        **extra,
+    }
+    with open(os.path.join(build_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def read_manifest(build_dir):
+    """Manifest van een build; {} voor de oude indeling zonder manifest."""
+    try:
+        with open(os.path.join(build_dir, MANIFEST_NAME), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def check_manifest(build_dir, manifest, checksums=False):
+    """Controleer grootte (en optioneel checksum) van elk artefact; ValueError bij een afwijking."""
+    for name, entry in manifest.get("artifacts", {}).items():
+        path = os.path.join(build_dir, entry["file"])
+        if not os.path.exists(path) or os.path.getsize(path) != entry["bytes"]:
+            raise ValueError(f"{path} ontbreekt of heeft een andere grootte dan in het manifest")
+        if checksums and file_sha256(path) != entry["sha256"]:
+            raise ValueError(f"{path}: checksum wijkt af van het manifest")
+
+
+def publish(build_dir, keep=BUILD_KEEP):
+    """
+    Maak `build_dir` de actieve build: de pointer wordt via een tijdelijk
+    bestand + os.replace in één keer omgezet, zodat lezers altijd een
+    complete build zien. Daarna worden oude builds opgeruimd (de nieuwste
+    `keep` blijven staan voor apps die nog een oudere build gebruiken).
+    """
+    tmp = CURRENT_BUILD_FILE + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(os.path.basename(os.path.normpath(build_dir)))
+    os.replace(tmp, CURRENT_BUILD_FILE)
+    prune_builds(keep)
+
+
+def prune_builds(keep=BUILD_KEEP):
+    current = os.path.normpath(current_build_dir())
+    builds = sorted(os.listdir(BUILDS_DIR)) if os.path.isdir(BUILDS_DIR) else []
+    for name in builds[:max(0, len(builds) - keep)]:
+        path = os.path.join(BUILDS_DIR, name)
+        if os.path.normpath(path) != current:
+            # Op Windows blijven gemapte bestanden van een draaiende app staan; volgende keer opnieuw
+            shutil.rmtree(path, ignore_errors=True)
@@ -1,31 +1,109 @@
-import json, faiss, os
+import json, os, threading, time
+import numpy as np
 import streamlit as st
-from parameters import DOCS_FILE, META_FILE, FAISS_INDEX_FILE, OUTPUT_DIR
-from rank_bm25 import BM25Okapi
+from parameters import VERSION, DOCS_FILE, RELOAD_CHECK_SECONDS
+from RAG.bm25 import BM25Index
+from RAG.facets import Facets, FACET_FIELDS
+from RAG.ann import load_index_info, load_index, reconstructs_exactly
+from RAG.docstore import DocStore, write_docstore
+from RAG.dedup import load_aliases
+from RAG.builds import artifact, current_build_dir, read_manifest, check_manifest
 
-@st.cache_resource
-def load_all():
-    with open(DOCS_FILE, encoding="utf-8") as f:
-        docs = json.load(f)
-    index = faiss.read_index(FAISS_INDEX_FILE)
-    with open(META_FILE, encoding="utf-8") as f:
-        meta = json.load(f)
 
-    id_to_doc = {d["id"]: d for d in docs}
-    ids = [m["id"] for m in meta]   # ✅ instead of meta["ids"]
+class Build:
+    """
+    Alle artefacten van één gepubliceerde build, samen geladen en samen
+    vervangen: docstore (alleen metadata in geheugen), FAISS index (mmap),
+    document-vectoren, BM25 en facets lopen dus altijd rij voor rij gelijk.
+    """
+
+    def __init__(self, build_dir):
+        self.dir = build_dir
+        self.manifest = read_manifest(build_dir)
+        check_manifest(build_dir, self.manifest)
+        self.build_id = self.manifest.get("build_id", "legacy")
+
+        docstore_file = artifact(build_dir, "docstore")
+        if not os.path.exists(docstore_file) and build_dir == VERSION:
+            # Builds van vóór docs.parquet: één keer omzetten vanuit docs.json
+            with open(DOCS_FILE, encoding="utf-8") as f:
+                write_docstore(json.load(f), docstore_file)
+        self.store = DocStore(docstore_file, aliases=load_aliases(artifact(build_dir, "aliases")))
+
+        index_file = artifact(build_dir, "index")
+        self.index = load_index(index_file, load_index_info(artifact(build_dir, "index_info")))
+        if self.index.ntotal != len(self.store):
+            raise ValueError(f"{index_file} ({self.index.ntotal}) en {docstore_file} ({len(self.store)}) "
+                             "lopen niet gelijk, draai build_index.py opnieuw")
+
+        embeddings_file = artifact(build_dir, "embeddings")
+        if os.path.exists(embeddings_file):
+            # mmap: alleen de rijen van de kandidaten worden echt ingelezen
+            self.doc_embs = np.load(embeddings_file, mmap_mode="r")
+        else:
+            # Oudere builds zonder embeddings.npy: geen kopie van alle vectoren in
+            # geheugen; search.gather_embeddings haalt per query alleen de
+            # kandidaten uit de index (reconstruct_batch). Dat kan alleen bij een
+            # flat index, de enige die exact de oorspronkelijke vectoren teruggeeft.
+            if not reconstructs_exactly(self.index):
+                raise ValueError(f"{embeddings_file} ontbreekt; nodig voor een {type(self.index).__name__}, "
+                                 "draai build_index.py opnieuw")
+            self.doc_embs = None
 
-    return docs, index, ids, id_to_doc
+        self.bm25 = BM25Index.load(artifact(build_dir, "bm25"))
+        self.facets = Facets(self.store.columns(FACET_FIELDS), aliases=self.store.aliases)
 
 
+class BuildWatcher:
+    """
+    Houdt de actieve Build bij. get() kijkt hooguit elke `check_every`
+    seconden of er een andere build gepubliceerd is en laadt die dan in een
+    achtergrond-thread; tot die klaar is krijgen queries de huidige build.
+    Lopende queries houden hun eigen referentie, de wissel is één toewijzing.
+    """
 
+    def __init__(self, check_every=RELOAD_CHECK_SECONDS):
+        self.check_every = check_every
+        self.build = Build(current_build_dir())
+        self._lock = threading.Lock()
+        self._loading = False
+        self._failed = None
+        self._last_check = time.monotonic()
 
-def load_bm25_index():
-    bm25_file = os.path.join(OUTPUT_DIR, "bm25.json")
-    with open(bm25_file, encoding="utf-8") as f:
-        bm25_meta = json.load(f)
+    def get(self):
+        now = time.monotonic()
+        if now - self._last_check >= self.check_every:
+            self._last_check = now
+            build_dir = current_build_dir()
+            if build_dir != self.build.dir and build_dir != self._failed:
+                self._reload_async(build_dir)
+        return self.build
+
+    def _reload_async(self, build_dir):
+        with self._lock:
+            if self._loading:
+                return
+            self._loading = True
+        threading.Thread(target=self._reload, args=(build_dir,), daemon=True, name="pgs-reload").start()
+
+    def _reload(self, build_dir):
+        try:
+            build = Build(build_dir)
+            self.build = build
+            print(f"🔄 Nieuwe build geladen: {build.build_id} ({len(build.store)} chunks)")
+        except Exception as e:
+            self._failed = build_dir   # niet elke check opnieuw proberen; de vorige build blijft actief
+            print(f"⚠️ Build {build_dir} niet geladen, vorige blijft actief: {e}")
+        finally:
+            self._loading = False
+
+
+@st.cache_resource
+def get_build_watcher():
+    """Eén BuildWatcher per proces, gedeeld door alle sessies."""
+    return BuildWatcher()
 
-    tokenized_corpus = bm25_meta["tokenized_corpus"]
-    ids = bm25_meta["ids"]
 
-    bm25 = BM25Okapi(tokenized_corpus)
-    return bm25, ids
\ No newline at end of file
+def load_current_build():
+    """De actieve Build; haal hem één keer per zoekactie op en gebruik al zijn onderdelen."""
+    return get_build_watcher().get()
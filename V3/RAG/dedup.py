@@ -0,0 +1,167 @@
+import hashlib
+import json
+import zlib
+from collections import Counter
+import numpy as np
+from parameters import DEDUP_THRESHOLD, DEDUP_NUM_PERM, DEDUP_BANDS, DEDUP_SHINGLE
+from RAG.analyzer import analyze
+from RAG.doctext import indexed_content
+
+_PRIME = (1 << 31) - 1
+# Velden van een duplicaat die bij de canonieke chunk bewaard blijven
+ALIAS_FIELDS = ("id", "pgs", "type", "title", "source")
+# Gestructureerde velden die exact gelijk moeten zijn om samen te vallen:
+# die gaan niet mee in de alias en zouden anders uit de index verdwijnen
+STRUCTURED_FIELDS = ("items", "tables", "grondslag", "doelen", "scenarios")
+
+
+def structure_key(doc):
+    """Vingerafdruk van de gestructureerde velden; alleen chunks met dezelfde sleutel kunnen samenvallen."""
+    payload = json.dumps([doc.get(f) or [] for f in STRUCTURED_FIELDS], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).digest()
+
+
+def shingles(text, k=DEDUP_SHINGLE):
+    """Hashes (crc32) van de woord-k-grammen van een tekst; korte teksten zijn één shingle."""
+    tokens = analyze(text)
+    if len(tokens) <= k:
+        grams = {" ".join(tokens)} if tokens else set()
+    else:
+        grams = {" ".join(tokens[i:i + k]) for i in range(len(tokens) - k + 1)}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype="uint64", count=len(grams))
+
+
+class NearDuplicateIndex:
+    """
+    MinHash + LSH over woord-shingles. `add(text, group)` geeft de positie
+    van een eerder toegevoegde tekst uit dezelfde `group` waarvan de geschatte
+    Jaccard-gelijkenis minstens `threshold` is, of -1 als de tekst nieuw
+    (canoniek) is.
+
+    Alleen canonieke teksten komen in de LSH-buckets, dus de eerste van een
+    groep bijna-gelijke chunks wint en het werk per tekst blijft begrensd,
+    ook bij boilerplate die in elke publicatie terugkomt. Werkt in één
+    doorgang (streaming build) en geeft bij dezelfde volgorde hetzelfde resultaat.
+    """
+
+    def __init__(self, threshold=DEDUP_THRESHOLD, num_perm=DEDUP_NUM_PERM, bands=DEDUP_BANDS,
+                 shingle=DEDUP_SHINGLE, seed=0):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) moet een veelvoud zijn van bands ({bands})")
+        self.threshold = threshold
+        self.shingle = shingle
+        self.bands, self.rows = bands, num_perm // bands
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _PRIME, size=num_perm, dtype="uint64")[:, None]
+        self._b = rng.integers(0, _PRIME, size=num_perm, dtype="uint64")[:, None]
+        self._exact = {}          # (group, sha1 van de tekst) → positie (exacte duplicaten zonder MinHash)
+        self._buckets = {}
+        self._signatures = {}
+        self.n = 0
+
+    def signature(self, text):
+        x = shingles(text, self.shingle)
+        if not len(x):
+            return None
+        return ((self._a * x + self._b) % _PRIME).min(axis=1)
+
+    def add(self, text, group=None):
+        pos, self.n = self.n, self.n + 1
+        digest = (group, hashlib.sha1((text or "").encode("utf-8")).digest())
+        if digest in self._exact:
+            return self._exact[digest]
+        sig = self.signature(text)
+        if sig is None:
+            return -1
+        keys = [(group, band, sig[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+
+        candidates = sorted({c for key in keys for c in self._buckets.get(key, ())})
+        best, best_sim = -1, self.threshold
+        for c in candidates:
+            sim = float(np.mean(self._signatures[c] == sig))
+            if sim >= best_sim and (best < 0 or sim > best_sim):
+                best, best_sim = c, sim
+        if best >= 0:
+            return best
+
+        self._exact[digest] = pos
+        self._signatures[pos] = sig
+        for key in keys:
+            self._buckets.setdefault(key, []).append(pos)
+        return -1
+
+
+class Deduplicator:
+    """
+    Ingest-stap vóór het embedden: laat alleen canonieke chunks door en
+    onthoudt per canonieke chunk (rijnummer in de build) de weggelaten
+    bijna-duplicaten als aliases. Vergelijkt op de geïndexeerde inhoud
+    (text_for_indexing zonder id/titel), zodat gedeelde tekst tussen
+    publicaties (PGS33-1/33-2, PGS37-1/37-2) samenvalt, maar alleen als ook
+    items, tabellen, grondslag, doelen en scenario's exact gelijk zijn: een
+    alias bewaart die velden niet.
+    """
+
+    def __init__(self, threshold=DEDUP_THRESHOLD, **kw):
+        self.index = NearDuplicateIndex(threshold, **kw) if threshold else None
+        self.aliases = {}         # rij van de canonieke chunk → [alias-velden van de duplicaten]
+        self.total = Counter()    # chunks per PGS
+        self.dropped = Counter()  # duplicaten per PGS
+        self.kept = 0
+        self._rows = []           # positie in de invoer → rij in de build (van de canonieke chunk)
+
+    def filter(self, docs):
+        """Generator: de canonieke chunks van `docs`, in dezelfde volgorde."""
+        for doc in docs:
+            self.total[doc.get("pgs")] += 1
+            canonical = (self.index.add(indexed_content(doc), structure_key(doc))
+                         if self.index is not None else -1)
+            if canonical < 0:
+                self._rows.append(self.kept)
+                self.kept += 1
+                yield doc
+            else:
+                row = self._rows[canonical]
+                self._rows.append(row)
+                self.dropped[doc.get("pgs")] += 1
+                self.aliases.setdefault(row, []).append({f: doc.get(f) for f in ALIAS_FIELDS})
+
+    def report(self):
+        """Per PGS: aantal chunks, duplicaten en de verhouding; plus het totaal."""
+        per_pgs = {
+            pgs: {"chunks": n, "duplicates": self.dropped[pgs], "ratio": round(self.dropped[pgs] / n, 4)}
+            for pgs, n in sorted(self.total.items(), key=lambda kv: str(kv[0]))
+        }
+        total, dropped = sum(self.total.values()), sum(self.dropped.values())
+        return {"threshold": self.index.threshold if self.index is not None else None,
+                "chunks": total, "duplicates": dropped, "ratio": round(dropped / total, 4) if total else 0.0,
+                "per_pgs": per_pgs}
+
+    def print_report(self):
+        report = self.report()
+        print(f"🧬 Near-duplicates: {report['duplicates']} van {report['chunks']} chunks "
+              f"({report['ratio']:.1%}) samengevoegd als alias")
+        for pgs, r in report["per_pgs"].items():
+            if r["duplicates"]:
+                print(f"   {pgs}: {r['duplicates']}/{r['chunks']} ({r['ratio']:.1%})")
+        return report
+
+
+def dedup_docs(docs, threshold=DEDUP_THRESHOLD):
+    """Canonieke chunks (lijst) + de Deduplicator met aliases en rapport."""
+    dedup = Deduplicator(threshold)
+    return list(dedup.filter(docs)), dedup
+
+
+def save_aliases(aliases, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({str(row): entries for row, entries in sorted(aliases.items())}, f, ensure_ascii=False)
+
+
+def load_aliases(path):
+    """Aliases per rij ({} als de build er geen heeft, bv. builds van vóór de deduplicatie)."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return {int(row): entries for row, entries in json.load(f).items()}
+    except FileNotFoundError:
+        return {}
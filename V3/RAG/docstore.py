@@ -0,0 +1,136 @@
+import json
+import os
+import threading
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from parameters import DOCSTORE_FILE, DOCSTORE_ROW_GROUP
+
+# Metadata-kolommen worden bij het starten ingelezen; text en extra (items,
+# tables, grondslag, ... als JSON) pas per hit.
+META_COLUMNS = ("id", "pgs", "type", "title", "source")
+LAZY_COLUMNS = ("text", "extra")
+
+
+def _str(value):
+    return None if value is None else str(value)
+
+
+SCHEMA = pa.schema([(c, pa.string()) for c in META_COLUMNS + LAZY_COLUMNS])
+
+
+def _table(docs):
+    columns = {c: [_str(d.get(c)) for d in docs] for c in META_COLUMNS}
+    columns["text"] = [d.get("text") or "" for d in docs]
+    columns["extra"] = [
+        json.dumps({k: v for k, v in d.items() if k not in META_COLUMNS and k != "text"}, ensure_ascii=False)
+        for d in docs
+    ]
+    return pa.table(columns, schema=SCHEMA)
+
+
+class DocStoreWriter:
+    """
+    Schrijft de chunk-store batch voor batch (streaming build), één rij per
+    chunk in aanlevervolgorde. Het bestand verschijnt pas bij close().
+    """
+
+    def __init__(self, path=DOCSTORE_FILE, row_group_size=DOCSTORE_ROW_GROUP):
+        self.path = path
+        self.row_group_size = row_group_size
+        self.rows = 0
+        self._writer = pq.ParquetWriter(path + ".tmp", SCHEMA, compression="zstd")
+
+    def write(self, docs):
+        if docs:
+            self._writer.write_table(_table(docs), row_group_size=self.row_group_size)
+            self.rows += len(docs)
+
+    def close(self):
+        self._writer.close()
+        os.replace(self.path + ".tmp", self.path)
+
+
+def write_docstore(docs, path=DOCSTORE_FILE, row_group_size=DOCSTORE_ROW_GROUP):
+    """
+    Schrijf de chunks als Parquet, één rij per chunk in de volgorde van
+    `docs` (rij i == FAISS-rij i == BM25-rij i). Kleine row groups, zodat
+    het ophalen van een paar hits maar een paar kleine blokken decodeert.
+    """
+    writer = DocStoreWriter(path, row_group_size)
+    writer.write(docs)
+    writer.close()
+
+
+class DocStore:
+    """
+    Kolomgewijze chunk-store (Parquet) met integer rij-id's die gelijk lopen
+    met de FAISS index.
+
+    Bij het openen worden alleen de metadata-kolommen gelezen (ids, facets,
+    titels); `get(rows)` haalt de volledige documenten van alleen die rijen
+    op, door enkel de row groups te decoderen waar ze in vallen.
+    `aliases` (rij → weggelaten bijna-duplicaten, zie RAG/dedup.py) komen
+    als "aliases"-veld bij de opgehaalde documenten.
+    """
+
+    def __init__(self, path=DOCSTORE_FILE, aliases=None):
+        self.path = path
+        self.aliases = aliases or {}
+        self._file = pq.ParquetFile(path)
+        self._lock = threading.Lock()   # ParquetFile-reads niet tegelijk vanuit meerdere sessies
+        self.meta = self._file.read(columns=list(META_COLUMNS))
+        self.ids = self.meta.column("id").to_pylist()
+        sizes = [self._file.metadata.row_group(i).num_rows for i in range(self._file.num_row_groups)]
+        self._starts = np.concatenate([[0], np.cumsum(sizes)]).astype("int64")
+
+    def __len__(self):
+        return self.meta.num_rows
+
+    def __getitem__(self, row):
+        return self.get([row])[0]
+
+    def column(self, name):
+        """Eén kolom als lijst (metadata uit het geheugen, text/extra van schijf)."""
+        if name in META_COLUMNS:
+            return self.meta.column(name).to_pylist()
+        with self._lock:
+            return self._file.read(columns=[name]).column(0).to_pylist()
+
+    def columns(self, names):
+        return {name: self.column(name) for name in names}
+
+    def get(self, rows, columns=LAZY_COLUMNS):
+        """
+        Volledige documenten (dicts zoals in docs.json) van de opgegeven rijen,
+        in dezelfde volgorde. `columns` beperkt welke lazy kolommen gelezen
+        worden (bv. alleen "text").
+        """
+        rows = np.asarray(rows, dtype="int64")
+        docs = self.meta.take(pa.array(rows)).to_pylist()
+        if not len(rows) or not columns:
+            self._add_aliases(rows, docs)
+            return docs
+
+        groups = np.searchsorted(self._starts, rows, side="right") - 1
+        needed = np.unique(groups)
+        with self._lock:
+            part = self._file.read_row_groups(needed.tolist(), columns=list(columns))
+        # rij → positie binnen de ingelezen row groups
+        offsets = np.concatenate([[0], np.cumsum(self._starts[needed + 1] - self._starts[needed])])
+        local = offsets[np.searchsorted(needed, groups)] + rows - self._starts[groups]
+        part = part.take(pa.array(local))
+
+        if "text" in columns:
+            for doc, text in zip(docs, part.column("text").to_pylist()):
+                doc["text"] = text
+        if "extra" in columns:
+            for doc, extra in zip(docs, part.column("extra").to_pylist()):
+                doc.update(json.loads(extra))
+        self._add_aliases(rows, docs)
+        return docs
+
+    def _add_aliases(self, rows, docs):
+        for row, doc in zip(rows.tolist(), docs):
+            if row in self.aliases:
+                doc["aliases"] = self.aliases[row]
@@ -0,0 +1,56 @@
+def normalize_tables(tables):
+    """Zet tabellen altijd om naar strings (1 regel per rij)."""
+    norm = []
+    for row in tables:
+        if isinstance(row, str):
+            norm.append(row)
+
+        elif isinstance(row, (list, tuple)):
+            # bv. ["ADR 2023", "rijksoverheid.nl"]
+            parts = []
+            for cell in row:
+                if isinstance(cell, dict):
+                    txt = cell.get("text", "")
+                    url = cell.get("url")
+                    if url:
+                        parts.append(f"{txt} ({url})")
+                    else:
+                        parts.append(txt)
+                else:
+                    parts.append(str(cell))
+            norm.append("; ".join(parts))
+
+        elif isinstance(row, dict):
+            # losse dict als cell
+            txt = row.get("text", "")
+            url = row.get("url")
+            norm.append(f"{txt} ({url})" if url else txt)
+
+        else:
+            norm.append(str(row))
+    return norm
+
+
+def content_parts(doc):
+    """De geïndexeerde inhoud van een doc zonder id en titel (zie text_for_indexing)."""
+    parts = [
+        doc.get("text",""),
+        "\n".join(doc.get("items",[])),
+        "\n".join(normalize_tables(doc.get("tables",[]))),
+    ]
+    if doc.get("type") == "measure":
+        parts.append("\n".join(doc.get("grondslag", [])))
+        parts.append("\n".join(d["id"] + " " + d["title"] for d in doc.get("doelen", [])))
+        parts.append("\n".join(s["id"] + " " + s["title"] for s in doc.get("scenarios", [])))
+    return parts
+
+
+def text_for_indexing(doc):
+    """Tekst die in FAISS en BM25 gaat: id + titel + content_parts."""
+    parts = [doc.get("id",""), doc.get("title","")] + content_parts(doc)
+    return "\n".join(p for p in parts if p)
+
+
+def indexed_content(doc):
+    """text_for_indexing zonder id en titel: waar de deduplicatie op vergelijkt."""
+    return "\n".join(p for p in content_parts(doc) if p)
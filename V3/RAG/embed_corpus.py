@@ -0,0 +1,81 @@
+import os
+import time
+import numpy as np
+from parameters import EMBED_BATCH_SIZE, EMBED_WORKERS, EMBED_BUCKET_SIZE
+
+
+def token_lengths(model, texts):
+    """Aantal tokens per tekst (tokenizer van het model; anders aantal woorden)."""
+    tokenizer = getattr(model, "tokenizer", None)
+    if tokenizer is None:
+        return np.array([len(t.split()) for t in texts])
+    enc = tokenizer(list(texts), add_special_tokens=False, truncation=False)["input_ids"]
+    return np.array([len(ids) for ids in enc])
+
+
+def length_buckets(lengths, bucket_size=EMBED_BUCKET_SIZE):
+    """Posities gesorteerd op lengte, opgeknipt in buckets van ~gelijke lengte (weinig padding)."""
+    order = np.argsort(lengths, kind="stable")
+    return [order[i:i + bucket_size] for i in range(0, len(order), bucket_size)]
+
+
+def resolve_workers(workers=EMBED_WORKERS):
+    return workers or os.cpu_count() or 1
+
+
+def encode_corpus(model, texts, batch_size=EMBED_BATCH_SIZE, workers=EMBED_WORKERS, bucket_size=EMBED_BUCKET_SIZE):
+    """
+    Encodeer een corpus in lengte-buckets, bij workers > 1 verdeeld over een
+    multi-process pool (één proces per CPU-core bij workers=0).
+
+    Levert per bucket (posities, vectoren) op, zodat de aanroeper de vectoren
+    op hun oorspronkelijke rij kan wegschrijven terwijl de rest nog loopt.
+    """
+    if len(texts) == 0:
+        return
+    workers = resolve_workers(workers)
+    buckets = length_buckets(token_lengths(model, texts), bucket_size)
+
+    if workers == 1:
+        for positions in buckets:
+            vecs = model.encode([texts[i] for i in positions], batch_size=batch_size,
+                                convert_to_numpy=True, normalize_embeddings=True)
+            yield positions, np.asarray(vecs, dtype="float32")
+        return
+
+    # Eén torch-thread-set per proces i.p.v. elk proces alle cores
+    saved = {k: os.environ.get(k) for k in ("OMP_NUM_THREADS", "MKL_NUM_THREADS")}
+    threads = str(max(1, (os.cpu_count() or workers) // workers))
+    os.environ.update(OMP_NUM_THREADS=threads, MKL_NUM_THREADS=threads)
+    try:
+        pool = model.start_multi_process_pool(target_devices=["cpu"] * workers)
+    finally:
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+
+    try:
+        # Per ronde krijgt elke worker één bucket (chunk_size = bucket_size)
+        for start in range(0, len(buckets), workers):
+            wave = buckets[start:start + workers]
+            positions = np.concatenate(wave)
+            vecs = model.encode([texts[i] for i in positions], pool=pool, batch_size=batch_size,
+                                chunk_size=bucket_size, convert_to_numpy=True, normalize_embeddings=True)
+            yield positions, np.asarray(vecs, dtype="float32")
+    finally:
+        model.stop_multi_process_pool(pool)
+
+
+def encode_into(model, texts, out, rows=None, **kwargs):
+    """
+    Encodeer texts en schrijf vector i naar out[rows[i]] (of out[i]).
+    Geeft het aantal embeddings per seconde terug.
+    """
+    rows = np.arange(len(texts)) if rows is None else np.asarray(rows)
+    t0 = time.perf_counter()
+    for positions, vecs in encode_corpus(model, texts, **kwargs):
+        out[rows[positions]] = vecs
+    elapsed = time.perf_counter() - t0
+    return len(texts) / elapsed if elapsed > 0 else 0.0
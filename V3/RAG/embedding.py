@@ -1,11 +1,166 @@
+import atexit
+import os
+import threading
+import unicodedata
+from collections import OrderedDict
 import numpy as np
 from sentence_transformers import SentenceTransformer
 import streamlit as st
-from parameters import EMBEDDING_MODEL
+from parameters import EMBEDDING_MODEL, QUERY_CACHE_SIZE, QUERY_CACHE_FILE, QUERY_CACHE_SAVE_EVERY
+from RAG.utils import pack_strings, unpack_strings
 
 @st.cache_resource
 def load_local_model():
-    return SentenceTransformer(EMBEDDING_MODEL)
+    model = SentenceTransformer(EMBEDDING_MODEL)
+    model.pgs_model_name = EMBEDDING_MODEL   # sleutel voor de query-cache
+    return model
+
+
+def model_name(model):
+    return getattr(model, "pgs_model_name", EMBEDDING_MODEL)
+
+
+def normalize_query(text):
+    """Cache-sleutel van een query: NFC + witruimte samengevoegd (hoofdletters blijven, het model is cased)."""
+    return " ".join(unicodedata.normalize("NFC", text or "").split())
+
+
+class QueryCache:
+    """
+    LRU-cache van query-vectoren, sleutel (modelnaam, genormaliseerde query).
+
+    Begrensd op max_size entries; met een pad wordt de cache bij het starten
+    ingelezen en regelmatig (elke save_every nieuwe vectoren + bij afsluiten)
+    naar een .npz weggeschreven, zodat herhaalde vragen ook na een herstart
+    het model overslaan. Het tussentijds wegschrijven gebeurt in een
+    achtergrond-thread, zodat geen enkele query op de schijf wacht.
+    """
+
+    def __init__(self, max_size=QUERY_CACHE_SIZE, path=QUERY_CACHE_FILE, save_every=QUERY_CACHE_SAVE_EVERY):
+        self.max_size = max_size
+        self.path = path
+        self.save_every = save_every
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._unsaved = 0
+        self._saving = False
+        if path and os.path.exists(path):
+            self._load()
+
+    def get(self, key):
+        with self._lock:
+            vec = self._data.get(key)
+            if vec is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return vec
+
+    def put(self, key, vec):
+        vec = np.array(vec, dtype="float32")
+        vec.setflags(write=False)
+        with self._lock:
+            self._data[key] = vec
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+            self._unsaved += 1
+            save = self.path and self._unsaved >= self.save_every
+        if save:
+            self._save_async()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._data),
+                "hit_rate": self.hits / total if total else 0.0}
+
+    def save(self):
+        if not self.path:
+            return
+        # Momentopname en schrijven onder één lock: een latere save schrijft
+        # nooit vóór een eerdere, dus het bestand loopt niet terug in de tijd
+        with self._save_lock:
+            with self._lock:
+                items = list(self._data.items())
+                self._unsaved = 0
+            arrays = {}
+            models = sorted({m for (m, _), _ in items})
+            for i, m in enumerate(models):
+                rows = [(q, v) for (mm, q), v in items if mm == m]
+                arrays[f"queries_{i}"] = pack_strings([q for q, _ in rows])
+                arrays[f"vectors_{i}"] = np.stack([v for _, v in rows])
+            tmp = self.path + ".tmp.npz"
+            np.savez(tmp, models=pack_strings(models), **arrays)
+            os.replace(tmp, self.path)
+
+    def _save_async(self):
+        with self._lock:
+            if self._saving:
+                return
+            self._saving = True
+        threading.Thread(target=self._save_background, daemon=True, name="pgs-query-cache").start()
+
+    def _save_background(self):
+        try:
+            self.save()
+        except OSError as e:
+            print(f"⚠️ Query-cache {self.path} niet weggeschreven: {e}")
+        finally:
+            self._saving = False
+
+    def _load(self):
+        try:
+            with np.load(self.path) as z:
+                for i, m in enumerate(unpack_strings(z["models"])):
+                    for q, v in zip(unpack_strings(z[f"queries_{i}"]), z[f"vectors_{i}"]):
+                        v.setflags(write=False)
+                        self._data[(m, q)] = v
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ Query-cache {self.path} niet leesbaar, begin leeg: {e}")
+            self._data.clear()
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+
+_query_cache = None
+
+
+def get_query_cache():
+    """Eén QueryCache per proces (wordt bij afsluiten naar QUERY_CACHE_FILE geschreven)."""
+    global _query_cache
+    if _query_cache is None:
+        _query_cache = QueryCache()
+        atexit.register(_query_cache.save)
+    return _query_cache
+
 
 def embed_local(model, text):
-    return np.array([model.encode(text, normalize_embeddings=True)], dtype="float32")
+    cache = get_query_cache()
+    key = (model_name(model), normalize_query(text))
+    vec = cache.get(key)
+    if vec is None:
+        vec = model.encode(key[1], normalize_embeddings=True)
+        cache.put(key, vec)
+    return np.array([vec], dtype="float32")
+
+def embed_local_batch(model, texts, batch_size=64):
+    """Meerdere teksten in één (gepadde) batch: matrix (n x dim) float32. Gecachte queries slaan het model over."""
+    if not texts:
+        return np.empty((0, model.get_sentence_embedding_dimension()), dtype="float32")
+    cache = get_query_cache()
+    name = model_name(model)
+    keys = [(name, normalize_query(t)) for t in texts]
+    vecs = [cache.get(key) for key in keys]
+    missing = [i for i, v in enumerate(vecs) if v is None]
+    if missing:
+        embs = model.encode([keys[i][1] for i in missing], batch_size=batch_size,
+                            normalize_embeddings=True, convert_to_numpy=True)
+        for i, emb in zip(missing, embs):
+            cache.put(keys[i], emb)
+            vecs[i] = emb
+    return np.asarray(np.stack(vecs), dtype="float32")
+
@@ -0,0 +1,96 @@
+import json
+import os
+import re
+import numpy as np
+from parameters import EMBED_CACHE_DIR
+
+HASH_DTYPE = "S40"   # hex SHA-1 van text_for_indexing (zie RAG/incremental.chunk_hash)
+
+
+class EmbeddingCache:
+    """
+    Persistente vector-cache per model, sleutel = content-hash van de
+    index-tekst. Gedeeld door alle builds (en versies): identieke teksten
+    worden één keer ge-embed en terugschakelen naar een eerder gebruikt
+    model kost alleen een lookup.
+
+    Per model een map met
+      vectors.f32  float32-rijen achter elkaar (memory-mapped gelezen)
+      hashes.bin   de hash van elke rij, zelfde volgorde (index-bestand)
+      info.json    modelnaam en dimensie
+    Beide bestanden worden alleen aangevuld; na een onderbroken schrijfactie
+    telt alleen het deel waar hash én vector van aanwezig zijn.
+    """
+
+    def __init__(self, model_name, root=EMBED_CACHE_DIR):
+        self.model_name = model_name
+        self.dir = os.path.join(root, re.sub(r"[^\w.-]", "_", model_name))
+        self.vectors_path = os.path.join(self.dir, "vectors.f32")
+        self.hashes_path = os.path.join(self.dir, "hashes.bin")
+        self.info_path = os.path.join(self.dir, "info.json")
+        self.dim = None
+        self._n = 0
+        self._rows = {}
+        self._vectors = None
+        self._load()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _load(self):
+        if not os.path.exists(self.info_path):
+            return
+        with open(self.info_path, encoding="utf-8") as f:
+            self.dim = json.load(f)["dim"]
+        hashes = np.fromfile(self.hashes_path, dtype=HASH_DTYPE) if os.path.exists(self.hashes_path) else []
+        n_vecs = os.path.getsize(self.vectors_path) // (4 * self.dim) if os.path.exists(self.vectors_path) else 0
+        n = min(len(hashes), n_vecs)
+        # Half geschreven staart (onderbroken build) afkappen, anders lopen latere rijen scheef
+        if n_vecs > n:
+            os.truncate(self.vectors_path, n * 4 * self.dim)
+        if len(hashes) > n:
+            os.truncate(self.hashes_path, n * np.dtype(HASH_DTYPE).itemsize)
+        for row, h in enumerate(hashes[:n]):
+            self._rows.setdefault(h.decode("ascii"), row)
+        self._n = n
+
+    def vectors(self):
+        """Alle gecachte vectoren als read-only memmap (n x dim)."""
+        if self._vectors is None and self._rows:
+            self._vectors = np.memmap(self.vectors_path, dtype="float32", mode="r", shape=(self._n, self.dim))
+        return self._vectors
+
+    def lookup(self, hashes):
+        """Per hash de cache-rij, of -1 als de vector er (nog) niet in zit."""
+        return np.array([self._rows.get(h, -1) for h in hashes], dtype="int64")
+
+    def get(self, rows):
+        return np.asarray(self.vectors()[rows], dtype="float32")
+
+    def add(self, hashes, vecs):
+        """Voeg nieuwe (hash, vector)-paren toe; al bekende hashes worden overgeslagen."""
+        vecs = np.ascontiguousarray(vecs, dtype="float32")
+        first = {}
+        for i, h in enumerate(hashes):
+            if h not in self._rows:
+                first.setdefault(h, i)
+        new = list(first.values())
+        if not new:
+            return
+        if self.dim is None:
+            self.dim = vecs.shape[1]
+            os.makedirs(self.dir, exist_ok=True)
+            with open(self.info_path, "w", encoding="utf-8") as f:
+                json.dump({"model": self.model_name, "dim": self.dim}, f)
+        elif vecs.shape[1] != self.dim:
+            raise ValueError(f"Dimensie {vecs.shape[1]} past niet bij de cache van {self.model_name} ({self.dim})")
+
+        # Eerst de vectoren, dan de hashes: een rij telt pas als beide er staan
+        self._vectors = None
+        with open(self.vectors_path, "ab") as f:
+            vecs[new].tofile(f)
+        with open(self.hashes_path, "ab") as f:
+            np.array([hashes[i] for i in new], dtype=HASH_DTYPE).tofile(f)
+        for i in new:
+            self._rows[hashes[i]] = self._n
+            self._n += 1
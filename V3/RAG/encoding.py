@@ -1,37 +1,32 @@
-def fix_encoding(s: str) -> str:
-    """Fix encoding-issues (bv. â → ’) en vervang rare symbolen."""
-    if not isinstance(s, str):
-        return s
-    try:
-        s = s.encode("latin1").decode("utf-8")
-    except (UnicodeEncodeError, UnicodeDecodeError):
-        pass  # gewoon doorgaan als dit niet lukt
+import re
+
+# Vervangingen voor rare tekens, als één str.translate-tabel (één pass per string)
+REPLACEMENTS = {
+    "": "-",   # rare bullet uit PDF
+    "•": "-",   # gewone bullet
+    "–": "-",   # en-dash → normaal streepje
+    "—": "-",   # em-dash → normaal streepje
+    "“": "\"",
+    "”": "\"",
+    "’": "'",
+    "´": "'",
+    "·": "-",   # soms puntjes in tabellen
+}
+REPAIR_TABLE = str.maketrans(REPLACEMENTS)
 
-    # Extra replacements voor rare tekens
-    replacements = {
-        "": "-",   # rare bullet uit PDF
-        "•": "-",   # gewone bullet
-        "–": "-",   # en-dash → normaal streepje
-        "—": "-",   # em-dash → normaal streepje
-        "“": "\"",
-        "”": "\"",
-        "’": "'",
-        "´": "'",
-        "•": "-",
-        "·": "-",   # soms puntjes in tabellen
-    }
-    for bad, good in replacements.items():
-        s = s.replace(bad, good)
+# UTF-8 dat als latin1 gelezen is: een lead-byte (C2-F4) gevolgd door een
+# continuation-byte (80-BF), bv. "Ã©" voor "é". Zonder zo'n paar kan de
+# latin1 → utf-8 round-trip niets veranderen (alleen ASCII) of niet slagen.
+MOJIBAKE_RE = re.compile("[\xc2-\xf4][\x80-\xbf]")
 
-    return s
 
-def fix_json_encoding(obj):
-    """Pas encoding-fix toe op dicts, lists en strings (recursief)."""
-    if isinstance(obj, dict):
-        return {k: fix_json_encoding(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [fix_json_encoding(x) for x in obj]
-    elif isinstance(obj, str):
-        return fix_encoding(obj)
-    else:
-        return obj
+def fix_encoding(s: str) -> str:
+    """Fix encoding-issues (bv. â → ’) en vervang rare symbolen."""
+    if not isinstance(s, str) or s.isascii():
+        return s
+    if MOJIBAKE_RE.search(s):
+        try:
+            s = s.encode("latin1").decode("utf-8")
+        except (UnicodeEncodeError, UnicodeDecodeError):
+            pass  # gewoon doorgaan als dit niet lukt
+    return s.translate(REPAIR_TABLE)
@@ -0,0 +1,68 @@
+import numpy as np
+
+FACET_FIELDS = ("pgs", "type", "source")
+
+
+def normalize_pgs(label):
+    return (label or "").replace(" ", "").upper()
+
+
+class Facets:
+    """
+    Vooraf berekende bitsets (bool-masker per waarde) voor pgs, type en source.
+
+    Rij i hoort bij FAISS-rij i / BM25-rij i (alles wordt uit dezelfde
+    docs.json gebouwd), dus een filter levert direct de rijnummers op die
+    doorzocht moeten worden. `columns`: per veld de waarden in rijvolgorde
+    (zie DocStore.columns). Een canonieke chunk met aliases (RAG/dedup.py)
+    matcht ook op de pgs, het type en de source van zijn aliases, zodat een
+    filter tekst die met een andere publicatie of een ander doc-type gedeeld
+    wordt niet kwijtraakt.
+    """
+
+    def __init__(self, columns, aliases=None):
+        self.n = len(columns[FACET_FIELDS[0]])
+        self.bitsets = {field: {} for field in FACET_FIELDS}
+        for field in FACET_FIELDS:
+            column = np.array([v or "" for v in columns[field]], dtype=object)
+            for value in np.unique(column):
+                self.bitsets[field][value] = column == value
+        self.alias_bitsets = {field: {} for field in FACET_FIELDS}
+        for row, entries in (aliases or {}).items():
+            for entry in entries:
+                for field in FACET_FIELDS:
+                    bits = self.alias_bitsets[field].setdefault(entry.get(field) or "", np.zeros(self.n, dtype=bool))
+                    bits[row] = True
+
+    def values(self, field):
+        return sorted(v for v in self.bitsets[field] if v)
+
+    def mask(self, pgs=None, type=None, source=None):
+        """Bool-masker van de rijen die aan alle opgegeven filters voldoen (None = geen filter)."""
+        mask = None
+        if pgs:
+            # Prefix-match zoals voorheen: "PGS33" matcht PGS33-1 en PGS33-2
+            norm = normalize_pgs(pgs)
+            values = {v for bitsets in (self.bitsets["pgs"], self.alias_bitsets["pgs"]) for v in bitsets}
+            mask = self._union(v for v in values if normalize_pgs(v).startswith(norm))
+        for field, value in (("type", type), ("source", source)):
+            if value:
+                values = [value] if isinstance(value, str) else value
+                m = self._union(values, field)
+                mask = m if mask is None else mask & m
+        return mask
+
+    def rows(self, pgs=None, type=None, source=None):
+        """Rijnummers (int64) van de matches, of None als er niet gefilterd wordt."""
+        mask = self.mask(pgs=pgs, type=type, source=source)
+        return None if mask is None else np.flatnonzero(mask)
+
+    def _union(self, values, field="pgs"):
+        """Rijen met een van de waarden, zelf of via een alias."""
+        mask = np.zeros(self.n, dtype=bool)
+        for v in values:
+            for bitsets in (self.bitsets[field], self.alias_bitsets[field]):
+                bits = bitsets.get(v)
+                if bits is not None:
+                    mask |= bits
+        return mask
@@ -0,0 +1,189 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+import httpx
+from parameters import SCRAPE_CONCURRENCY, SCRAPE_RATE, SCRAPE_RETRIES, SCRAPE_BACKOFF, SCRAPE_TIMEOUT, FETCH_STATE_FILE
+
+# Tijdelijke fouten waarna opnieuw geprobeerd wordt
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class HostLimiter:
+    """Per host: hooguit `concurrency` requests tegelijk en minstens 1/rate seconde tussen twee starts."""
+
+    def __init__(self, concurrency=SCRAPE_CONCURRENCY, rate=SCRAPE_RATE):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait_turn(self):
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def retry_after(response):
+    """Wachttijd (s) uit de Retry-After header, of None."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+def conditional_headers(entry):
+    """If-None-Match / If-Modified-Since uit de vorige response van deze url."""
+    headers = {}
+    if entry and entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry and entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+
+class FetchState:
+    """
+    Per url de ETag, Last-Modified en sha256 van de laatste volledige
+    response (plus wat de scraper er verder bij bewaart), als JSON.
+    """
+
+    def __init__(self, path=FETCH_STATE_FILE):
+        self.path = path
+        try:
+            with open(path, encoding="utf-8") as f:
+                self.urls = json.load(f)
+        except FileNotFoundError:
+            self.urls = {}
+
+    def get(self, url):
+        return self.urls.get(url)
+
+    def set(self, url, entry):
+        self.urls[url] = entry
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.urls, f, ensure_ascii=False, indent=1)
+        os.replace(self.path + ".tmp", self.path)
+
+
+class Fetcher:
+    """
+    Asynchrone HTTP-client voor de scraper: één gedeelde httpx.AsyncClient
+    (keep-alive verbindingen worden hergebruikt), per host een limiet op het
+    aantal gelijktijdige requests en op het tempo, en bij time-outs,
+    verbindingsfouten en 408/429/5xx opnieuw proberen met exponentiële
+    backoff (of de Retry-After van de server).
+
+        async with Fetcher() as fetcher:
+            html, entry = await fetcher.get_text(url, cached=previous_entry)
+            entry = await fetcher.download(pdf_url, path, cached=previous_entry)
+
+    Met `cached` (de entry van de vorige keer, zie FetchState) wordt een
+    conditionele request gestuurd; bij 304 komt die entry terug met
+    "changed": False (get_text geeft dan geen tekst).
+    """
+
+    def __init__(self, concurrency=SCRAPE_CONCURRENCY, rate=SCRAPE_RATE, retries=SCRAPE_RETRIES,
+                 backoff=SCRAPE_BACKOFF, timeout=SCRAPE_TIMEOUT):
+        self.concurrency, self.rate = concurrency, rate
+        self.retries, self.backoff, self.timeout = retries, backoff, timeout
+        self.client = None
+        self._hosts = {}
+
+    async def __aenter__(self):
+        self.client = httpx.AsyncClient(
+            timeout=self.timeout,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=self.concurrency),
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.client.aclose()
+
+    def _limiter(self, url):
+        host = urlsplit(url).netloc
+        if host not in self._hosts:
+            self._hosts[host] = HostLimiter(self.concurrency, self.rate)
+        return self._hosts[host]
+
+    async def request(self, url, handle, headers=None):
+        """
+        GET `url` als stream en geef de response aan `handle` (async, leest de
+        body zelf); geeft het resultaat van handle terug. httpx.HTTPError als
+        ook de laatste poging mislukt.
+        """
+        limiter = self._limiter(url)
+        for attempt in range(self.retries + 1):
+            last = attempt == self.retries
+            delay = None
+            async with limiter.semaphore:
+                await limiter.wait_turn()
+                try:
+                    async with self.client.stream("GET", url, headers=headers) as resp:
+                        if resp.status_code not in RETRY_STATUS or last:
+                            if resp.status_code != 304:    # 304 is voor httpx een fout (redirect zonder Location)
+                                resp.raise_for_status()
+                            return await handle(resp)
+                        delay = retry_after(resp)
+                        print(f"  ↻ {url}: HTTP {resp.status_code}, poging {attempt + 2}/{self.retries + 1}")
+                except httpx.TransportError as e:
+                    if last:
+                        raise
+                    print(f"  ↻ {url}: {type(e).__name__}, poging {attempt + 2}/{self.retries + 1}")
+            # Wachten buiten de semaphore, zodat andere downloads doorgaan
+            await asyncio.sleep(delay if delay is not None else self.backoff * 2 ** attempt)
+
+    async def get_text(self, url, cached=None):
+        """(tekst, entry); tekst is None als de server 304 Not Modified geeft."""
+        async def handle(resp):
+            if resp.status_code == 304:
+                return None, {**cached, "changed": False}
+            body = await resp.aread()
+            return resp.text, _entry(resp, hashlib.sha256(body).hexdigest(), len(body), cached)
+        return await self.request(url, handle, headers=conditional_headers(cached))
+
+    async def download(self, url, path, cached=None):
+        """
+        Stream de body direct naar `path` (via een .part-bestand, dus nooit
+        half geschreven). Geeft de entry voor FetchState terug, met "bytes",
+        "sha256" en "changed" (False bij 304 of een identieke inhoud). Geef
+        `cached` alleen mee als het bestand van de vorige keer nog bestaat.
+        """
+        async def handle(resp):
+            if resp.status_code == 304:
+                return {**cached, "changed": False}
+            h, size = hashlib.sha256(), 0
+            with open(path + ".part", "wb") as f:
+                async for chunk in resp.aiter_bytes():
+                    f.write(chunk)
+                    h.update(chunk)
+                    size += len(chunk)
+            os.replace(path + ".part", path)
+            return _entry(resp, h.hexdigest(), size, cached)
+        return await self.request(url, handle, headers=conditional_headers(cached))
+
+
+def _entry(resp, sha256, size, cached):
+    return {
+        "etag": resp.headers.get("ETag"),
+        "last_modified": resp.headers.get("Last-Modified"),
+        "sha256": sha256,
+        "bytes": size,
+        "changed": not cached or cached.get("sha256") != sha256,
+    }
@@ -1,85 +1,166 @@
 import re
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, CData, NavigableString
 from bs4 import UnicodeDammit
-from RAG.encoding import fix_json_encoding
+from lxml import etree
+import lxml.html
+from parameters import HTML_BACKEND
+from RAG.encoding import fix_encoding
+
+HTML_BACKENDS = ("bs4", "lxml")
+
+# Secties binnen een maatregel/doel/scenario die geen eigen blok zijn maar
+# bij het omliggende blok horen: de lijsten met gerelateerde doelen,
+# scenario's en maatregelen, en de voetnoot.
+RELATION_SECTIONS = ("goals", "scenarios", "measures", "footer")
+
+# Zelfde soort strings als get_text() meeneemt (geen commentaar, script, style)
+TEXT_TYPES = (NavigableString, CData)
+
+# Subtrees die nooit inhoud van een doc opleveren (de inhoudsopgave in <nav>,
+# scripts en de iconen); beide backends slaan ze in hun geheel over.
+SKIP_TAGS = frozenset({"nav", "script", "style", "template", "noscript", "svg", "rt", "rp"})
 
 
 def clean(s: str) -> str:
-    return re.sub(r"\s+", " ", s or "").strip()
+    """Witruimte samenvoegen en de encoding repareren; elk veld van een doc komt hier één keer langs."""
+    return fix_encoding(re.sub(r"\s+", " ", s or "").strip())
 
 
-def parse_block(section, base_url: str, pgs_label: str):
-    """Parse een sectie (maatregel, doel, scenario of gewone sectie)."""
-    label_span = section.select_one("span.label")
-    label = clean(label_span.get_text()) if label_span else None
-
-    title_span = section.find("span", class_="title")
-    title = clean(title_span.get_text()) if title_span else "Ongetitelde sectie"
-
-    details = section.find("div", class_="details")
-    text = clean(details.get_text(" ", strip=True)) if details else clean(section.get_text(" ", strip=True))
-
-    items = [
-        clean(li.get_text(" ", strip=True))
-        for li in (details.find_all("li") if details else section.find_all("li"))
-    ]
-
-    grondslag = [clean(span.get_text(" ", strip=True)) for span in section.select("div.bases span.content")]
-
-    doelen = []
-    for a in section.select("section.goals a"):
-        doelen.append({
-            "id": clean(a.find("span", class_="label").get_text()),
-            "title": clean(a.find("span", class_="title").get_text())
-        })
-
-    scenarios = []
-    for a in section.select("section.scenarios a"):
-        scenarios.append({
-            "id": clean(a.find("span", class_="label").get_text()),
-            "title": clean(a.find("span", class_="title").get_text())
-        })
-
-    # --- Verbeterde tabel-parsing (met headers + caption + links) ---
-    tables = []
-    table_texts = []  # extra voor indexing in "text"
-    for table in section.find_all("table"):
-        rows = []
-
-        # Neem caption mee (als die er is)
-        caption = table.find("caption")
-        if caption:
-            cap_text = clean(caption.get_text(" ", strip=True))
-            if cap_text:
-                table_texts.append(f"Caption: {cap_text}")
-
-        headers = [clean(th.get_text(" ", strip=True)) for th in table.find_all("th")]
-        for tr in table.find_all("tr"):
-            cells = []
-            row_text_parts = []
-            for j, td in enumerate(tr.find_all("td")):
-                link = td.find("a", href=True)
-                if link:
-                    txt = clean(link.get_text(" ", strip=True))
-                    url = link["href"]
-                    cells.append({"text": txt, "url": url})
-                    col_name = headers[j] if j < len(headers) and headers[j] else f"kolom{j+1}"
-                    row_text_parts.append(f"{col_name}: {txt} ({url})")
-                else:
-                    txt = clean(td.get_text(" ", strip=True))
-                    cells.append({"text": txt, "url": None})
-                    col_name = headers[j] if j < len(headers) and headers[j] else f"kolom{j+1}"
-                    row_text_parts.append(f"{col_name}: {txt}")
-            if cells:
-                rows.append(cells)
-                if row_text_parts:
-                    table_texts.append("; ".join(row_text_parts))
-        if rows:
-            tables.append(rows)
+def relation_of(section):
+    """Naam van de relatie-sectie ("goals", ...), of None als de sectie een eigen blok is."""
+    classes = section.get("class") or []
+    return next((c for c in RELATION_SECTIONS if c in classes), None)
+
+
+def parse_table(table):
+    """Eén <table> → (rijen met cellen, regels voor de indexeerbare tekst)."""
+    rows = []
+    table_texts = []
+
+    # Neem caption mee (als die er is)
+    caption = table.find("caption")
+    if caption:
+        cap_text = clean(caption.get_text(" ", strip=True))
+        if cap_text:
+            table_texts.append(f"Caption: {cap_text}")
+
+    headers = [clean(th.get_text(" ", strip=True)) for th in table.find_all("th")]
+    for tr in table.find_all("tr"):
+        cells = []
+        row_text_parts = []
+        for j, td in enumerate(tr.find_all("td")):
+            link = td.find("a", href=True)
+            col_name = headers[j] if j < len(headers) and headers[j] else f"kolom{j+1}"
+            if link:
+                txt = clean(link.get_text(" ", strip=True))
+                url = fix_encoding(link["href"])
+                cells.append({"text": txt, "url": url})
+                row_text_parts.append(f"{col_name}: {txt} ({url})")
+            else:
+                txt = clean(td.get_text(" ", strip=True))
+                cells.append({"text": txt, "url": None})
+                row_text_parts.append(f"{col_name}: {txt}")
+        if cells:
+            rows.append(cells)
+            if row_text_parts:
+                table_texts.append("; ".join(row_text_parts))
+    return rows, table_texts
+
+
+class Block:
+    """Wat de walker voor één sectie verzamelt; alleen de eigen inhoud, niet die van geneste secties."""
+
+    def __init__(self, section):
+        self.section = section
+        self.label = None
+        self.title = None
+        self.has_details = False
+        self.strings = []           # alle eigen tekst-nodes
+        self.details_strings = []   # idem, binnen div.details
+        self.items = []
+        self.details_items = []
+        self.grondslag = []
+        self.doelen = []
+        self.scenarios = []
+        self.tables = []
+        self.table_texts = []
+
+
+def walk(node, block, blocks, nested=True, details=False, relation=None, bases=False):
+    """
+    Eén pass over de DOM: elke tekst-node, lijst en tabel wordt toegekend
+    aan het dichtstbijzijnde omliggende blok (de binnenste sectie die geen
+    relatie-sectie is). Een geneste sectie opent een nieuw blok in `blocks`
+    (pre-order, dus in documentvolgorde) of wordt overgeslagen als nested=False.
+    """
+    for child in node.children:
+        if isinstance(child, NavigableString):
+            if type(child) in TEXT_TYPES:
+                text = child.strip()
+                if text:
+                    block.strings.append(text)
+                    if details:
+                        block.details_strings.append(text)
+            continue
+
+        name = child.name
+        if name in SKIP_TAGS:
+            continue
+        classes = child.get("class") or []
+
+        if name == "section":
+            child_relation = relation_of(child)
+            if child_relation is None:
+                if nested:
+                    inner = Block(child)
+                    blocks.append(inner)
+                    walk(child, inner, blocks)
+                continue
+            walk(child, block, blocks, nested, details, child_relation, bases)
+            continue
+
+        if relation is None and name == "span":
+            if "label" in classes and block.label is None:
+                block.label = clean(child.get_text())
+            elif "title" in classes and block.title is None:
+                block.title = clean(child.get_text())
+        if bases and name == "span" and "content" in classes:
+            block.grondslag.append(clean(child.get_text(" ", strip=True)))
+        if relation in ("goals", "scenarios") and name == "a":
+            label, title = child.find("span", class_="label"), child.find("span", class_="title")
+            if label and title:
+                target = block.doelen if relation == "goals" else block.scenarios
+                target.append({"id": clean(label.get_text()), "title": clean(title.get_text())})
+        if name == "li":
+            item = clean(child.get_text(" ", strip=True))
+            block.items.append(item)
+            if details:
+                block.details_items.append(item)
+        if name == "table":
+            rows, table_texts = parse_table(child)
+            if rows:
+                block.tables.append(rows)
+            block.table_texts.extend(table_texts)
+
+        in_details = details or (name == "div" and "details" in classes)
+        block.has_details |= in_details
+        walk(child, block, blocks, nested, in_details, relation,
+             bases or (name == "div" and "bases" in classes))
+
+
+def block_doc(block, base_url: str, pgs_label: str):
+    """Een verzameld blok → doc, of None als het blok niets bevat (bv. een sectie met alleen een <hr>)."""
+    label = block.label
+    title = block.title or "Ongetitelde sectie"
+    text = clean(" ".join(block.details_strings if block.has_details else block.strings))
+    items = block.details_items if block.has_details else block.items
+
+    if not (text or items or block.tables or block.doelen or block.scenarios):
+        return None
 
     # Tabellen ook toevoegen aan text zodat ze worden geïndexeerd
-    if table_texts:
-        text += "\n\nTabellen:\n" + "\n".join(table_texts)
+    if block.table_texts:
+        text += "\n\nTabellen:\n" + "\n".join(block.table_texts)
 
     node_type = "section"
     if label:
@@ -94,33 +175,227 @@ def parse_block(section, base_url: str, pgs_label: str):
         node_type = "measure"
 
     return {
-        "id": f"{pgs_label}-{node_type}-{label or section.get('id') or title[:30]}",
+        "id": f"{pgs_label}-{node_type}-{label or block.section.get('id') or title[:30]}",
         "type": node_type,
         "pgs": pgs_label,
         "title": title,
-        "text": text,        # <-- nu bevat ook titels + tabellen (incl. caption)
+        "text": text,        # <-- eigen tekst + tabellen (incl. caption), zonder geneste secties
         "items": items,
-        "grondslag": grondslag,
-        "doelen": doelen,
-        "scenarios": scenarios,
-        "tables": tables,    # <-- structured tables blijven behouden
+        "grondslag": block.grondslag,
+        "doelen": block.doelen,
+        "scenarios": block.scenarios,
+        "tables": block.tables,    # <-- structured tables blijven behouden
         "source": base_url,
     }
 
 
+def parse_block(section, base_url: str, pgs_label: str):
+    """Parse een sectie (maatregel, doel, scenario of gewone sectie), zonder de geneste secties."""
+    block = Block(section)
+    walk(section, block, [], nested=False, relation=relation_of(section))
+    return block_doc(block, base_url, pgs_label)
 
-def parse_html_file(html_path: str, source_url: str, pgs_label: str):
-    """Parse een opgeslagen HTML-bestand in gestructureerde docs met encoding-detectie."""
-    docs = []
+
+# ---------------------------------------------------------------------------
+# lxml-backend: dezelfde walk direct over de lxml-boom, zonder BeautifulSoup.
+# Levert exact dezelfde docs als de bs4-backend (zie parse_html_file).
+# ---------------------------------------------------------------------------
+def _has_class(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+# Tekst-nodes zoals get_text() ze ziet: niet uit script, style, template, rt, rp
+_TEXT = "text()[not(ancestor::script or ancestor::style or ancestor::template or ancestor::rt or ancestor::rp)]"
+
+XP_LABELS = etree.XPath(f"//span[{_has_class('label')}]")
+XP_TITLES = etree.XPath(f"//span[{_has_class('title')}]")
+XP_DETAILS = etree.XPath(f"//div[{_has_class('details')}]")
+XP_BASES = etree.XPath(f"//div[{_has_class('bases')}]")
+XP_CONTENTS = etree.XPath(f"//span[{_has_class('content')}]")
+XP_LINK_LABEL = etree.XPath(f"descendant::span[{_has_class('label')}][1]")
+XP_LINK_TITLE = etree.XPath(f"descendant::span[{_has_class('title')}][1]")
+XP_TEXTS = etree.XPath(f"descendant::{_TEXT}")
+XP_CAPTION = etree.XPath("descendant::caption[1]")
+XP_TH = etree.XPath("descendant::th")
+XP_TR = etree.XPath("descendant::tr")
+XP_TD = etree.XPath("descendant::td")
+XP_LINK = etree.XPath("descendant::a[@href][1]")
+
+# Zelfde zoekgebied en patroon als UnicodeDammit voor <meta charset=...>
+CHARSET_RE = re.compile(rb"""<\s*meta[^>]+charset\s*=\s*["']?([^>]*?)[ /;'">]""", re.I)
+
+
+def decode_html(raw: bytes) -> str:
+    """
+    Bytes → tekst. Decodeert met de gedeclareerde charset als die er is en
+    de bytes daarmee foutloos te decoderen zijn; alleen anders (geen
+    declaratie, BOM, XML-declaratie of een charset die niet klopt) wordt
+    UnicodeDammit erbij gehaald. UnicodeDammit(raw) kijkt zelf niet naar
+    <meta charset> en gokt dan via charset-detectie (PGS8 werd zo ptcp154).
+    """
+    m = CHARSET_RE.search(raw[:max(2048, len(raw) // 20)])
+    if m and not raw.lstrip().startswith((b"<?", b"\xef\xbb\xbf", b"\xff\xfe", b"\xfe\xff")):
+        try:
+            return raw.decode(m.group(1).decode("ascii").lower())
+        except (LookupError, UnicodeDecodeError):
+            pass
+    return UnicodeDammit(raw).unicode_markup
+
+
+def _get_text(el, separator="", strip=False):
+    """Equivalent van bs4's el.get_text(separator, strip) voor een lxml-element."""
+    if strip:
+        return separator.join(s for s in (t.strip() for t in XP_TEXTS(el)) if s)
+    return separator.join(XP_TEXTS(el))
+
+
+def parse_table_lxml(table):
+    """parse_table voor een lxml-<table>."""
+    rows = []
+    table_texts = []
+
+    for caption in XP_CAPTION(table):
+        cap_text = clean(_get_text(caption, " ", strip=True))
+        if cap_text:
+            table_texts.append(f"Caption: {cap_text}")
+
+    headers = [clean(_get_text(th, " ", strip=True)) for th in XP_TH(table)]
+    for tr in XP_TR(table):
+        cells = []
+        row_text_parts = []
+        for j, td in enumerate(XP_TD(tr)):
+            link = XP_LINK(td)
+            col_name = headers[j] if j < len(headers) and headers[j] else f"kolom{j+1}"
+            if link:
+                txt = clean(_get_text(link[0], " ", strip=True))
+                url = fix_encoding(link[0].get("href"))
+                cells.append({"text": txt, "url": url})
+                row_text_parts.append(f"{col_name}: {txt} ({url})")
+            else:
+                txt = clean(_get_text(td, " ", strip=True))
+                cells.append({"text": txt, "url": None})
+                row_text_parts.append(f"{col_name}: {txt}")
+        if cells:
+            rows.append(cells)
+            if row_text_parts:
+                table_texts.append("; ".join(row_text_parts))
+    return rows, table_texts
+
+
+def _add_text(block, text, details):
+    text = text.strip() if text else ""
+    if text:
+        block.strings.append(text)
+        if details:
+            block.details_strings.append(text)
+
+
+def walk_lxml(el, block, blocks, marks, nested=True, details=False, relation=None, bases=False):
+    """
+    walk() voor een lxml-element. Tekst zit hier in el.text en in de .tail
+    van elk kind (die hoort bij el, niet bij het kind). `marks`: de
+    elementen die de voorgecompileerde XPath-expressies in één keer over het
+    hele document gevonden hebben (labels, titels, details, bases, contents).
+    """
+    _add_text(block, el.text, details)
+    for child in el:
+        tag = child.tag
+        # Commentaar en processing instructions hebben geen str-tag; hun tail telt wel
+        if isinstance(tag, str) and tag not in SKIP_TAGS:
+            _walk_lxml_child(child, tag, block, blocks, marks, nested, details, relation, bases)
+        _add_text(block, child.tail, details)
+
+
+def _walk_lxml_child(child, tag, block, blocks, marks, nested, details, relation, bases):
+    if tag == "section":
+        child_relation = relation_of_lxml(child)
+        if child_relation is None:
+            if nested:
+                inner = Block(child)
+                blocks.append(inner)
+                walk_lxml(child, inner, blocks, marks)
+            return
+        walk_lxml(child, block, blocks, marks, nested, details, child_relation, bases)
+        return
+
+    if relation is None:
+        if child in marks["labels"]:
+            if block.label is None:
+                block.label = clean(_get_text(child))
+        elif child in marks["titles"] and block.title is None:
+            block.title = clean(_get_text(child))
+    if bases and child in marks["contents"]:
+        block.grondslag.append(clean(_get_text(child, " ", strip=True)))
+    if relation in ("goals", "scenarios") and tag == "a":
+        label, title = XP_LINK_LABEL(child), XP_LINK_TITLE(child)
+        if label and title:
+            target = block.doelen if relation == "goals" else block.scenarios
+            target.append({"id": clean(_get_text(label[0])), "title": clean(_get_text(title[0]))})
+    if tag == "li":
+        item = clean(_get_text(child, " ", strip=True))
+        block.items.append(item)
+        if details:
+            block.details_items.append(item)
+    if tag == "table":
+        rows, table_texts = parse_table_lxml(child)
+        if rows:
+            block.tables.append(rows)
+        block.table_texts.extend(table_texts)
+
+    in_details = details or child in marks["details"]
+    block.has_details |= in_details
+    walk_lxml(child, block, blocks, marks, nested, in_details, relation, bases or child in marks["bases"])
+
+
+def relation_of_lxml(section):
+    classes = (section.get("class") or "").split()
+    return next((c for c in RELATION_SECTIONS if c in classes), None)
+
+
+def html_blocks_lxml(raw: bytes):
+    root = lxml.html.document_fromstring(decode_html(raw))
+    # Eén keer over het hele document; de walk hoeft daarna alleen nog op te zoeken
+    marks = {
+        "labels": set(XP_LABELS(root)),
+        "titles": set(XP_TITLES(root)),
+        "details": set(XP_DETAILS(root)),
+        "bases": set(XP_BASES(root)),
+        "contents": set(XP_CONTENTS(root)),
+    }
+    blocks = []
+    walk_lxml(root, Block(root), blocks, marks)
+    return blocks
+
+
+def html_blocks_bs4(raw: bytes):
+    soup = BeautifulSoup(decode_html(raw), "lxml")
+    blocks = []
+    walk(soup, Block(soup), blocks)
+    return blocks
+
+
+def parse_html_file(html_path: str, source_url: str, pgs_label: str, backend: str = HTML_BACKEND):
+    """
+    Parse een opgeslagen HTML-bestand in gestructureerde docs (encoding via decode_html).
+
+    Eén walk over het hele document: elke sectie wordt één doc met alleen
+    zijn eigen tekst en tabellen (een omliggende sectie herhaalt die van
+    zijn subsecties niet), dus de parse-tijd groeit lineair met het document.
+    backend: "bs4" (BeautifulSoup) of "lxml" (direct over de lxml-boom,
+    sneller); beide geven exact dezelfde docs.
+    """
+    if backend not in HTML_BACKENDS:
+        raise ValueError(f"Unknown HTML backend: {backend}")
     with open(html_path, "rb") as f:   # lees als bytes
         raw = f.read()
 
-    converted = UnicodeDammit(raw)     # detect & fix encoding
-    soup = BeautifulSoup(converted.unicode_markup, "lxml")
+    # Tekst buiten elke sectie (navigatie, header) hoort bij geen enkel doc
+    blocks = html_blocks_lxml(raw) if backend == "lxml" else html_blocks_bs4(raw)
 
-    for sec in soup.find_all("section"):
-        parsed = parse_block(sec, source_url, pgs_label)
+    docs = []
+    for block in blocks:
+        parsed = block_doc(block, source_url, pgs_label)
         if parsed:
             docs.append(parsed)
 
-    return fix_json_encoding(docs)
+    return docs
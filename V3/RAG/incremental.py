@@ -0,0 +1,41 @@
+import hashlib
+import json
+import numpy as np
+from parameters import CHUNK_MANIFEST_FILE
+
+
+def chunk_hash(text: str) -> str:
+    """Content-hash van de index-tekst van een chunk."""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def load_chunk_manifest(path=CHUNK_MANIFEST_FILE):
+    """
+    Manifest van de vorige build: per artefact ("faiss", "bm25") de
+    chunk-hashes in rijvolgorde (+ model / index-type bij faiss).
+    Leeg als er nog geen build is.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_chunk_manifest(manifest, path=CHUNK_MANIFEST_FILE):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+
+
+def plan_reuse(old_hashes, new_hashes):
+    """
+    Per nieuwe rij de rij in de vorige build met dezelfde content-hash, of -1
+    als de chunk nieuw of gewijzigd is. Geeft ook het aantal oude chunks dat
+    niet meer voorkomt (verwijderd).
+    """
+    old_rows = {}
+    for row, h in enumerate(old_hashes or []):
+        old_rows.setdefault(h, row)
+    reuse = np.array([old_rows.get(h, -1) for h in new_hashes], dtype="int64")
+    removed = len(set(old_rows) - set(new_hashes))
+    return reuse, removed
@@ -1,11 +1,23 @@
 import re
 import pdfplumber
-from RAG.encoding import fix_json_encoding
+from parameters import PDF_TEXT_BACKEND
+from RAG.encoding import fix_encoding
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:     # optioneel: alleen nodig voor PDF_TEXT_BACKEND = "pypdfium2"
+    pdfium = None
+
+PDF_BACKENDS = ("pdfplumber", "pypdfium2")
 
 # Regex patronen
 HEADING_RE = re.compile(r'^(?P<num>\d+(?:\.\d+)+)\s+(?P<title>.+)$', re.M)
 TRAIL_PAGE_RE = re.compile(r'\s+\d{1,3}$', re.M)
 
+# Tolerantie (pt) voor de tabel-voorselectie, gelijk aan de snap/join/
+# intersection-tolerantie van pdfplumber's "lines"-strategie
+GRID_TOLERANCE = 3
+
 
 def clean(s: str) -> str:
     return re.sub(r'\s+', ' ', s or '').strip()
@@ -17,7 +29,7 @@ def strip_trailing_page_number(title: str) -> str:
 
 
 def extract_sections_from_fulltext(full_text: str, pgs_label: str, source_url: str):
-    """Extracteer secties/maatregelen uit de volledige PDF-tekst."""
+    """Extracteer secties/maatregelen uit de volledige PDF-tekst (al door fix_encoding gehaald)."""
     docs = []
     matches = list(HEADING_RE.finditer(full_text))
 
@@ -50,53 +62,156 @@ def extract_sections_from_fulltext(full_text: str, pgs_label: str, source_url: s
             "source": source_url,
         })
 
-    return fix_json_encoding(docs)
+    return docs
 
 
-def scrape_pdf(pdf_path: str, source_url: str, pgs_label: str, keep_pages: bool = True):
-    """Scrape een PDF in secties (en optioneel page-docs als fallback)."""
-    docs = []
+def table_rows(raw_tables):
+    """extract_tables()-uitvoer → per tabel de rijen als "cel; cel; ..."."""
+    tables = []
+    for tbl in raw_tables or []:
+        row_texts = []
+        for row in tbl:
+            if row:
+                row_texts.append(fix_encoding("; ".join(cell or "" for cell in row)))
+        if row_texts:
+            tables.append(row_texts)
+    return tables
 
+
+def plumber_pages(pdf_path: str, with_tables: bool):
+    """(tekst, tabellen) per pagina via pdfplumber; de layout-cache van een pagina wordt direct weer vrijgegeven."""
     with pdfplumber.open(pdf_path) as pdf:
+        for page in pdf.pages:
+            text = page.extract_text() or ""
+            tables = table_rows(page.extract_tables()) if with_tables else []
+            page.close()
+            yield text, tables
+
+
+def path_edges(page, tol=GRID_TOLERANCE):
+    """
+    Horizontale (x0, x1, y) en verticale (y0, y1, x) randen van de
+    padobjecten op een pdfium-pagina, afgeleid uit hun bounding box: een
+    dunne box is een lijn, een vlak telt met alle vier zijden mee. Een pad
+    dat meerdere lijnen tekent wordt zo een vlak, dus nooit te weinig randen.
+    """
+    horizontal, vertical = [], []
+    for obj in page.get_objects(filter=(pdfium.raw.FPDF_PAGEOBJ_PATH,)):
+        x0, y0, x1, y1 = obj.get_bounds()
+        wide, tall = x1 - x0 > tol, y1 - y0 > tol
+        if wide:
+            horizontal.extend([(x0, x1, y0), (x0, x1, y1)] if tall else [(x0, x1, (y0 + y1) / 2)])
+        if tall:
+            vertical.extend([(y0, y1, x0), (y0, y1, x1)] if wide else [(y0, y1, (x0 + x1) / 2)])
+    return horizontal, vertical
+
+
+def has_table_grid(page, tol=GRID_TOLERANCE):
+    """
+    Voorselectie voor extract_tables: pdfplumber ("lines") vindt alleen een
+    tabel als er minstens één cel is, dus twee verticale randen die elk twee
+    horizontale randen kruisen. Losse kop-/voetlijnen halen dat niet.
+    """
+    horizontal, vertical = path_edges(page, tol)
+    if len(horizontal) < 2 or len(vertical) < 2:
+        return False
+    crossing = 0
+    for y0, y1, x in vertical:
+        hits = sum(1 for x0, x1, y in horizontal
+                   if x0 - tol <= x <= x1 + tol and y0 - tol <= y <= y1 + tol)
+        if hits >= 2:
+            crossing += 1
+            if crossing >= 2:
+                return True
+    return False
+
+
+def pdfium_pages(pdf_path: str, with_tables: bool):
+    """
+    (tekst, tabellen) per pagina: de tekst via pypdfium2 (veel sneller dan
+    pdfminer), tabellen via pdfplumber en alleen voor pagina's waar de
+    padobjecten een raster vormen (zie has_table_grid). pdfplumber wordt pas
+    geopend bij de eerste zo'n pagina.
+    """
+    pdf = pdfium.PdfDocument(pdf_path)
+    plumber = None
+    try:
+        for i in range(len(pdf)):
+            page = pdf[i]
+            textpage = page.get_textpage()
+            text = textpage.get_text_bounded()
+            has_grid = with_tables and has_table_grid(page)
+            textpage.close()
+            page.close()
+
+            tables = []
+            if has_grid:
+                plumber = plumber or pdfplumber.open(pdf_path)
+                layout_page = plumber.pages[i]
+                tables = table_rows(layout_page.extract_tables())
+                layout_page.close()
+
+            # pdfium geeft \r\n en spaties aan het eind van regels
+            lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+            yield "\n".join(line.rstrip() for line in lines).strip(), tables
+    finally:
+        if plumber is not None:
+            plumber.close()
+        pdf.close()
+
+
+def iter_pdf_pages(pdf_path: str, with_tables: bool = True, backend: str = PDF_TEXT_BACKEND):
+    """Lees elke pagina één keer: (tekst, tabellen) per pagina, in volgorde."""
+    if backend not in PDF_BACKENDS:
+        raise ValueError(f"Unknown PDF backend: {backend}")
+    if backend == "pypdfium2" and pdfium is None:
+        print("⚠️ pypdfium2 niet geïnstalleerd, terugvallen op pdfplumber")
+        backend = "pdfplumber"
+    pages = pdfium_pages if backend == "pypdfium2" else plumber_pages
+    return pages(pdf_path, with_tables)
+
+
+def scrape_pdf(pdf_path: str, source_url: str, pgs_label: str, keep_pages: bool = True,
+               backend: str = PDF_TEXT_BACKEND):
+    """
+    Scrape een PDF in secties (en optioneel page-docs als fallback).
+
+    Elke pagina wordt één keer gelezen: dezelfde tekst dient voor de
+    heading-detectie over de volledige tekst én voor de page-docs. Tabellen
+    worden alleen gezocht als er page-docs gemaakt worden.
+    """
+    page_texts = []
+    page_docs = []
+
+    for i, (text, tables) in enumerate(iter_pdf_pages(pdf_path, with_tables=keep_pages, backend=backend), start=1):
+        # Encoding één keer per pagina repareren; de secties komen uit dezelfde tekst
+        text = fix_encoding(text)
         # Full text voor heading-detectie
-        full_text = "\n".join(page.extract_text() or "" for page in pdf.pages)
-
-        # Secties extraheren
-        section_docs = extract_sections_from_fulltext(full_text, pgs_label, source_url)
-        docs.extend(section_docs)
-
-        if keep_pages:
-            for i, page in enumerate(pdf.pages, start=1):
-                text = (page.extract_text() or "").strip()
-
-                # --- Extra: tabellen parsen ---
-                tables = []
-                for tbl in page.extract_tables() or []:
-                    row_texts = []
-                    for row in tbl:
-                        if row:
-                            row_texts.append("; ".join(cell or "" for cell in row))
-                    if row_texts:
-                        tables.append(row_texts)
-
-                # Zet tabellen ook in text zodat ze indexeerbaar zijn
-                table_texts = ["; ".join(r) for r in tables]
-                if table_texts:
-                    text += "\n\n" + "\n".join(table_texts)
-
-                docs.append({
-                    "id": f"{pgs_label}-page-{i}",
-                    "type": "page",
-                    "pgs": pgs_label,
-                    "title": f"Page {i}",
-                    "text": text,
-                    "items": [],
-                    "grondslag": [],
-                    "doelen": [],
-                    "scenarios": [],
-                    "tables": tables,
-                    "source": source_url,
-                })
-
-    return fix_json_encoding(docs)
+        page_texts.append(text)
+        if not keep_pages:
+            continue
+
+        text = text.strip()
+        # Zet tabellen ook in text zodat ze indexeerbaar zijn
+        table_texts = ["; ".join(r) for r in tables]
+        if table_texts:
+            text += "\n\n" + "\n".join(table_texts)
+
+        page_docs.append({
+            "id": f"{pgs_label}-page-{i}",
+            "type": "page",
+            "pgs": pgs_label,
+            "title": f"Page {i}",
+            "text": text,
+            "items": [],
+            "grondslag": [],
+            "doelen": [],
+            "scenarios": [],
+            "tables": tables,
+            "source": source_url,
+        })
+
+    # Secties extraheren
+    section_docs = extract_sections_from_fulltext("\n".join(page_texts), pgs_label, source_url)
+    return section_docs + page_docs
 
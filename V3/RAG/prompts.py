@@ -8,10 +8,15 @@ def safe_text(t: str) -> str:
         return ""
     return t[:MAX_SECTION_CHARS] + ("..." if len(t) > MAX_SECTION_CHARS else "")
 
+def also_in(r):
+    """Regel met de andere publicaties waar (bijna) dezelfde tekst staat (aliases uit RAG/dedup.py)."""
+    others = sorted({a["pgs"] for a in r.get("aliases", []) if a.get("pgs") and a["pgs"] != r.get("pgs")})
+    return f"Ook in: {', '.join(others)}\n" if others else ""
+
 def make_prompt(query, retrieved):
     ctx = []
     for r in retrieved:
-        ctx.append(f"### {r['title']}\nBron: {r['source']}\n\n{safe_text(r['text'])}")
+        ctx.append(f"### {r['title']}\nBron: {r['source']}\n{also_in(r)}\n{safe_text(r['text'])}")
         if r.get("items"):
             ctx.append("• " + "\n• ".join(r["items"][:10]))
         if r.get("flat_table_text"):
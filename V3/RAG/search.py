@@ -1,68 +1,248 @@
 import numpy as np
-from rank_bm25 import BM25Okapi
-import json, os
-from parameters import OUTPUT_DIR
+import faiss
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from parameters import RRF_K, FUSION_ALPHA, FUSION_WORKERS, FILTER_EXACT_MAX_ROWS
+from RAG.bm25 import BM25Index
+from RAG.facets import Facets, FACET_FIELDS
+from RAG.docstore import DocStore
+from RAG.dedup import load_aliases
+from RAG.builds import artifact, current_build_dir
+from RAG.ann import search_params, reconstructs_exactly
+from RAG.utils import top_k_indices
+
+SEARCH_MODES = [
+    "FAISS",
+    "BM25",
+    "Hybrid (BM25 → FAISS rerank)",
+    "Fusion (BM25 + FAISS, RRF)",
+    "Fusion (BM25 + FAISS, score)",
+]
+
+# Helpers voor aanroepers zonder Build (zie data.Build): BM25 en facets van de
+# actieve build. De cache hangt aan de build-map, zodat ze na het publiceren
+# van een nieuwe build samen met de index en docstore opnieuw geladen worden.
+@lru_cache(maxsize=1)
+def _load_bm25(build_dir):
+    return BM25Index.load(artifact(build_dir, "bm25"))
+
+
+@lru_cache(maxsize=1)
+def _load_facets(build_dir):
+    aliases = load_aliases(artifact(build_dir, "aliases"))
+    return Facets(DocStore(artifact(build_dir, "docstore")).columns(FACET_FIELDS), aliases=aliases)
+
 
-# Helper: laad BM25 index
 def load_bm25():
-    bm25_file = os.path.join(OUTPUT_DIR, "bm25.json")
-    with open(bm25_file, encoding="utf-8") as f:
-        data = json.load(f)
-    bm25 = BM25Okapi(data["tokenized_corpus"])
-    return bm25, data["ids"]
-
-def search_measures(query, local_model, index, ids, id_to_doc, embed_func,
-                    pgs_filter=None, k=5, prefetch_k=200, mode="FAISS"):
+    return _load_bm25(current_build_dir())
+
+
+def load_facets():
+    return _load_facets(current_build_dir())
+
+
+def gather_embeddings(index, doc_embs, rows):
+    """
+    Document-vectoren van de opgegeven FAISS-rijen: uit doc_embs, of zonder
+    doc_embs uit de index zelf (alleen een flat index geeft ze exact terug).
+    """
+    if doc_embs is not None:
+        return np.asarray(doc_embs[rows], dtype="float32")
+    if not reconstructs_exactly(index):
+        raise ValueError("Zonder embeddings.npy kan alleen een flat index de document-vectoren leveren; "
+                         "draai build_index.py opnieuw")
+    return index.reconstruct_batch(np.asarray(rows, dtype="int64"))
+
+
+def _similarities(index, D):
+    """FAISS-afstanden → similarity (vectoren zijn genormaliseerd: L2² = 2 - 2·cos)."""
+    return 1 - D / 2 if index.metric_type == faiss.METRIC_L2 else D
+
+
+def faiss_search_batch(index, q_embs, k, rows=None, doc_embs=None, exact_max_rows=FILTER_EXACT_MAX_ROWS):
     """
-    Flexible search: FAISS, BM25, or Hybrid (BM25 → FAISS rerank).
+    Top-k FAISS-rijen + similarity per query (één index.search over de hele
+    query-matrix), optioneel beperkt tot `rows`.
+
+    Met een filter hangt de aanpak af van het aantal matchende rijen: tot
+    `exact_max_rows` een exacte scan over de opgeslagen doc_embs (altijd
+    min(k, len(rows)) resultaten, volle dimensie); daarboven, of zonder
+    doc_embs, de index zelf met een FAISS IDSelector. Een breed filter
+    zoekt dus met dezelfde ANN/reductie/opslag als ongefilterd zoeken (bij
+    IVF alleen binnen de nprobe clusters, dus soms minder dan k resultaten).
     """
+    if rows is None:
+        D, I = index.search(q_embs, k)
+        return [(i[i >= 0], _similarities(index, d[i >= 0])) for d, i in zip(D, I)]
+
+    k = min(k, len(rows))
+    if k == 0:
+        return [(np.empty(0, dtype="int64"), np.empty(0, dtype="float32")) for _ in q_embs]
+    if doc_embs is not None and len(rows) <= exact_max_rows:
+        sims = gather_embeddings(index, doc_embs, rows) @ q_embs.T
+        results = []
+        for j in range(sims.shape[1]):
+            top = top_k_indices(sims[:, j], k)
+            results.append((rows[top], sims[top, j]))
+        return results
+
+    D, I = index.search(q_embs, k, params=search_params(index, faiss.IDSelectorBatch(rows.astype("int64"))))
+    return [(i[i >= 0], _similarities(index, d[i >= 0])) for d, i in zip(D, I)]
+
+
+def faiss_search(index, q_emb, k, rows=None, doc_embs=None, exact_max_rows=FILTER_EXACT_MAX_ROWS):
+    """Top-k FAISS-rijen + similarity voor één query (zie faiss_search_batch)."""
+    return faiss_search_batch(index, q_emb, k, rows=rows, doc_embs=doc_embs, exact_max_rows=exact_max_rows)[0]
+
+
+def rrf_fuse(rankings, k, rrf_k=RRF_K):
+    """Reciprocal-rank fusion: som van 1 / (rrf_k + rang) over de rankings."""
+    fused = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, start=1):
+            fused[row] = fused.get(row, 0.0) + 1.0 / (rrf_k + rank)
+    return np.array(sorted(fused, key=fused.get, reverse=True)[:k], dtype="int64")
+
+
+def score_fuse(results, weights, k):
+    """Genormaliseerde score-fusie: per lijst min-max naar [0, 1], gewogen opgeteld."""
+    fused = {}
+    for (rows, scores), weight in zip(results, weights):
+        if len(rows) == 0:
+            continue
+        lo, hi = float(np.min(scores)), float(np.max(scores))
+        norm = (scores - lo) / (hi - lo) if hi > lo else np.ones(len(scores))
+        for row, score in zip(rows, norm):
+            fused[row] = fused.get(row, 0.0) + weight * float(score)
+    return np.array(sorted(fused, key=fused.get, reverse=True)[:k], dtype="int64")
 
+
+_fusion_pool = None
+
+
+def fusion_pool():
+    """Gedeelde thread-pool voor de parallelle BM25-zoekactie in de fusie-mode."""
+    global _fusion_pool
+    if _fusion_pool is None:
+        _fusion_pool = ThreadPoolExecutor(max_workers=FUSION_WORKERS, thread_name_prefix="pgs-fusion")
+    return _fusion_pool
+
+
+def filter_rows(facets, pgs_filter=None, type_filter=None, source_filter=None):
+    """Rijnummers die aan de filters voldoen, of None zonder filter."""
+    if not (pgs_filter or type_filter or source_filter):
+        return None
+    facets = facets or load_facets()
+    return facets.rows(pgs=pgs_filter, type=type_filter, source=source_filter)
+
+
+def rank_rows(mode, queries, embed, index, bm25, doc_embs, k, prefetch_k, rows=None):
+    """
+    Kern van search_measures(_batch): de top-k rijnummers per query, voor
+    queries die hetzelfde filter (`rows`) delen. embed() levert de
+    query-matrix (wordt niet aangeroepen bij BM25).
+    """
     # -----------------------
     # FAISS only
     # -----------------------
     if mode.upper() == "FAISS":
-        q_emb = embed_func(local_model, query)
-        D, I = index.search(q_emb, prefetch_k)
-        candidates = [id_to_doc[ids[idx]] for idx in I[0] if idx >= 0]
+        return [top for top, _ in faiss_search_batch(index, embed(), k, rows=rows, doc_embs=doc_embs)]
 
     # -----------------------
     # BM25 only
     # -----------------------
-    elif mode.upper() == "BM25":
-        bm25, bm25_ids = load_bm25()
-        tokenized_q = query.split()
-        scores = bm25.get_scores(tokenized_q)
-        top = np.argsort(scores)[::-1][:k]
-        candidates = [id_to_doc[bm25_ids[i]] for i in top]
+    if mode.upper() == "BM25":
+        return [top for top, _ in bm25.top_k_batch(queries, k, rows=rows)]
 
     # -----------------------
     # Hybrid: BM25 preselect → rerank with FAISS
     # -----------------------
-    elif mode.upper().startswith("HYBRID"):
-        bm25, bm25_ids = load_bm25()
-        tokenized_q = query.split()
-        scores = bm25.get_scores(tokenized_q)
-        top = np.argsort(scores)[::-1][:prefetch_k]   # breed zoeken
-        pre_candidates = [id_to_doc[bm25_ids[i]] for i in top]
-
-        # FAISS rerank
-        q_emb = embed_func(local_model, query)
-        cand_embs = [embed_func(local_model, d["text"]) for d in pre_candidates]
-        sims = np.dot(cand_embs, q_emb.T).flatten()
-        best = np.argsort(sims)[::-1][:k]
-        candidates = [pre_candidates[i] for i in best]
-
-    else:
-        raise ValueError(f"Unknown search mode: {mode}")
+    if mode.upper().startswith("HYBRID"):
+        results = []
+        q_embs = embed()
+        for (top, _), q_emb in zip(bm25.top_k_batch(queries, prefetch_k, rows=rows), q_embs):   # breed zoeken
+            # FAISS rerank met de opgeslagen vectoren: 1 matmul per query.
+            # BM25 en FAISS zijn uit dezelfde docs.json gebouwd, dus BM25-rij i == FAISS-rij i.
+            sims = gather_embeddings(index, doc_embs, top) @ q_emb
+            results.append(top[np.argsort(sims)[::-1][:k]])
+        return results
 
     # -----------------------
-    # Apply PGS filter
+    # Fusion: BM25 en FAISS parallel, daarna RRF of score-fusie
     # -----------------------
-    if pgs_filter:
-        norm_filter = pgs_filter.replace(" ", "").upper()
-        candidates = [
-            d for d in candidates
-            if (d.get("pgs") or "").replace(" ", "").upper().startswith(norm_filter)
-        ]
-
-    return candidates[:k]
+    if mode.upper().startswith("FUSION"):
+        # BM25 draait op de pool terwijl deze thread de query encodeert en FAISS
+        # doorzoekt (torch, FAISS en numpy geven de GIL vrij): latency ≈ max van de twee.
+        lexical = fusion_pool().submit(bm25.top_k_batch, queries, prefetch_k, rows)
+        dense = faiss_search_batch(index, embed(), prefetch_k, rows=rows, doc_embs=doc_embs)
+        lexical = lexical.result()
+        if "SCORE" in mode.upper():
+            weights = (1 - FUSION_ALPHA, FUSION_ALPHA)
+            return [score_fuse([lex, den], weights, k) for lex, den in zip(lexical, dense)]
+        return [rrf_fuse([lex[0], den[0]], k) for lex, den in zip(lexical, dense)]
+
+    raise ValueError(f"Unknown search mode: {mode}")
+
+
+def search_measures(query, local_model, index, store, embed_func,
+                    pgs_filter=None, k=5, prefetch_k=200, mode="FAISS", doc_embs=None, bm25=None,
+                    type_filter=None, source_filter=None, facets=None):
+    """
+    Flexible search: FAISS, BM25, Hybrid (BM25 → FAISS rerank) or Fusion
+    (BM25 + FAISS parallel; "Fusion ... RRF" of "Fusion ... score").
+
+    store: de DocStore (zie data.Build); alleen de top-k rijen
+    worden daaruit volledig opgehaald.
+    doc_embs: document-vectoren in dezelfde rijvolgorde als de FAISS index
+    (zie data.Build). Zonder doc_embs haalt Hybrid de vectoren
+    van de kandidaten uit de index zelf; dat kan alleen bij een flat index
+    (oude builds), andere types vereisen embeddings.npy.
+    bm25: een geladen BM25Index (zie data.Build); anders wordt die van de
+    actieve build geladen (één keer per build).
+    pgs_filter / type_filter / source_filter worden vóór het zoeken via de
+    facet-bitsets (zie data.Build.facets) naar rijnummers vertaald; tot
+    FILTER_EXACT_MAX_ROWS matches wordt exact gescand, daarboven via de index
+    (zie faiss_search_batch).
+    """
+    if bm25 is None and mode.upper() != "FAISS":
+        bm25 = load_bm25()
+
+    rows = filter_rows(facets, pgs_filter, type_filter, source_filter)
+    embed = lambda: embed_func(local_model, query)
+    top = rank_rows(mode, [query], embed, index, bm25, doc_embs, k, prefetch_k, rows=rows)[0]
+    return store.get(top[:k])
+
+
+def search_measures_batch(queries, local_model, index, store, embed_batch_func,
+                          pgs_filters=None, k=5, prefetch_k=200, mode="FAISS", doc_embs=None, bm25=None,
+                          type_filter=None, source_filter=None, facets=None):
+    """
+    search_measures voor een lijst queries tegelijk (evaluatie, bulk-vragen).
+
+    Alle queries worden in één batch ge-encodeerd (embed_batch_func, bv.
+    embedding.embed_local_batch); per PGS-filter volgt één FAISS-zoekactie
+    over de query-matrix en één BM25-product voor alle queries.
+    pgs_filters: None of een lijst (één filter of None per query).
+    Geeft per query dezelfde hits als search_measures (op float-afronding van
+    de batch-encode na).
+    """
+    queries = list(queries)
+    if bm25 is None and mode.upper() != "FAISS":
+        bm25 = load_bm25()
+    q_embs = embed_batch_func(local_model, queries) if mode.upper() != "BM25" and queries else None
+
+    # Queries met hetzelfde filter samen zoeken
+    groups = {}
+    for i, pgs_filter in enumerate(pgs_filters or [None] * len(queries)):
+        groups.setdefault(pgs_filter, []).append(i)
+
+    results = [None] * len(queries)
+    for pgs_filter, idxs in groups.items():
+        rows = filter_rows(facets, pgs_filter, type_filter, source_filter)
+        tops = rank_rows(
+            mode, [queries[i] for i in idxs], lambda: q_embs[idxs],
+            index, bm25, doc_embs, k, prefetch_k, rows=rows,
+        )
+        for i, top in zip(idxs, tops):
+            results[i] = store.get(top[:k])
+    return results
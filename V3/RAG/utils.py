@@ -1,7 +1,36 @@
 import re
+import numpy as np
 
 def detect_pgs_from_query(query: str):
     match = re.search(r"\bPGS\s*-?\s*0*(\d+)\b", query, re.I)
     if match:
         return f"PGS{int(match.group(1))}"
     return None
+
+
+def top_k_indices(scores, k):
+    """Indices van de k hoogste scores (aflopend), via argpartition i.p.v. een volledige sort."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype="int64")
+    part = np.argpartition(-scores, k - 1)[:k]
+    return part[np.argsort(-scores[part], kind="stable")]
+
+
+def pack_strings(strings):
+    """Lijst strings → één utf-8 byte-array voor np.savez (strings mogen geen newline bevatten)."""
+    return np.frombuffer("\n".join(strings).encode("utf-8"), dtype="uint8")
+
+
+def unpack_strings(arr):
+    return arr.tobytes().decode("utf-8").split("\n") if len(arr) else []
+
+
+def peak_rss_mb():
+    """Piek-geheugen van dit proces (None op Windows, waar `resource` ontbreekt)."""
+    try:
+        import resource, sys
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024   # bytes op macOS, KB op Linux
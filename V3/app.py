@@ -3,12 +3,11 @@ load_dotenv()
 
 import streamlit as st
 from parameters import PROMPT_PRESETS, DEFAULT_TEMPERATURE
-from RAG.data import load_all
-from RAG.data import load_bm25_index
-from RAG.search import search_measures  # dit moet FAISS/BM25/Hybrid ondersteunen
+from RAG.data import load_current_build
+from RAG.search import search_measures, SEARCH_MODES  # FAISS / BM25 / Hybrid / Fusion
 from RAG.prompts import answer_with_context, safe_text
 from RAG.utils import detect_pgs_from_query
-from RAG.embedding import load_local_model, embed_local
+from RAG.embedding import load_local_model, embed_local, get_query_cache
 
 # -------------------------------
 # UI instellingen
@@ -31,10 +30,7 @@ temperature = st.sidebar.slider("Creativiteit (temperature)", 0.0, 1.0, DEFAULT_
 
 # Zoekopties
 st.sidebar.header("🔎 Zoekopties")
-search_mode = st.sidebar.selectbox(
-    "Kies zoekmethode",
-    ["FAISS", "BM25", "Hybrid (BM25 → FAISS rerank)"]
-)
+search_mode = st.sidebar.selectbox("Kies zoekmethode", SEARCH_MODES)
 
 pgs_filter_mode = st.sidebar.radio(
     "PGS filter:",
@@ -44,10 +40,17 @@ pgs_filter_mode = st.sidebar.radio(
 # -------------------------------
 # Data & modellen laden
 # -------------------------------
-docs, index, ids, id_to_doc = load_all()
-bm25, bm25_ids = load_bm25_index()              # BM25
+# Actieve build; een nieuw gepubliceerde build wordt op de achtergrond geladen
+# en is bij de volgende zoekactie in zijn geheel actief (nooit half)
+build = load_current_build()
+store, index = build.store, build.index         # docstore (metadata in geheugen) + FAISS index (mmap)
+doc_embs = build.doc_embs                       # voor de hybrid rerank
+bm25 = build.bm25                               # BM25 (één keer per build)
+facets = build.facets                           # bitsets voor pgs/type/source filters
 local_model = load_local_model()
 
+type_filter = st.sidebar.multiselect("Type fragmenten (leeg = alle):", facets.values("type"))
+
 # -------------------------------
 # Query invoer
 # -------------------------------
@@ -65,7 +68,7 @@ if st.button("Zoeken") or q:
         elif pgs_filter_mode == "Geen filter (alle PGS)":
             pgs_filter = None
         else:  # Handmatig kiezen
-            all_pgs = sorted({d.get("pgs") for d in docs if d.get("pgs")})
+            all_pgs = facets.values("pgs")
             pgs_filter = st.sidebar.selectbox("Kies PGS document:", all_pgs)
 
         st.sidebar.write(f"🔎 PGS filter: {pgs_filter or 'geen'}")
@@ -75,14 +78,20 @@ if st.button("Zoeken") or q:
             q,
             local_model,
             index,
-            ids,
-            id_to_doc,
+            store,
             embed_local,
             pgs_filter=pgs_filter,
             k=k,
-            mode=search_mode
+            mode=search_mode,
+            doc_embs=doc_embs,
+            bm25=bm25,
+            type_filter=type_filter,
+            facets=facets,
         )
 
+        qc = get_query_cache().stats()
+        st.sidebar.caption(f"Query-cache: {qc['hits']} hits / {qc['misses']} misses ({qc['size']} vectoren)")
+
         # Antwoord genereren
         ans = answer_with_context(q, hits, system_prompt, temperature)
         st.subheader("Antwoord")
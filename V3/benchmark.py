@@ -0,0 +1,166 @@
+# ------------------------------------------------------------------------------
+# benchmark.py
+#
+# Meet snelheid en kwaliteit van de retrieval op de gebouwde V3-artefacten:
+# een vaste (geversioneerde) set PGS-vragen met verwachte maatregel-id's gaat
+# door elke zoekmode van search_measures. Rapporteert p50/p95/p99 latency,
+# queries per seconde, piek-RSS en recall@k / MRR, en schrijft alles als JSON
+# weg zodat runs vergeleken kunnen worden. Met --reduce-dims ook de
+# afweging recall vs. indexgrootte van PCA / truncatie op de corpus-vectoren.
+#
+#   python V3/benchmark.py
+#   python V3/benchmark.py --modes FAISS BM25 --k 20 --repeat 5 --filter
+#   python V3/benchmark.py --reduce-dims 64 128 256
+# ------------------------------------------------------------------------------
+import os, re, json, time, argparse
+import numpy as np
+import faiss
+from parameters import (
+    BENCH_QUESTIONS_FILE, BENCH_RESULTS_DIR, EMBEDDING_MODEL, EVAL_QUERIES,
+)
+from RAG.data import Build
+from RAG.builds import artifact, current_build_dir
+from RAG.embedding import load_local_model, embed_local
+from RAG.search import search_measures, SEARCH_MODES
+from RAG.ann import REDUCE_METHODS, load_index_info, build_ann_index, evaluate_index
+from RAG.utils import peak_rss_mb
+
+
+def base_id(doc_id):
+    """Doc-id zonder chunk-suffix (PGS15-measure-M2-c3 → PGS15-measure-M2)."""
+    return re.sub(r"-c\d+$", "", doc_id)
+
+
+def embed_uncached(model, text):
+    """Query-encode zonder query-cache, zodat herhalingen echte model-latency meten."""
+    return np.array([model.encode(text, normalize_embeddings=True)], dtype="float32")
+
+
+def hit_ids(hit):
+    """Basis-id's die een hit dekt: de canonieke chunk plus zijn aliases (RAG/dedup.py)."""
+    return {base_id(hit["id"])} | {base_id(a["id"]) for a in hit.get("aliases") or []}
+
+
+def score_hits(hits, expected):
+    """(recall, reciprocal rank) van één vraag; een alias van een hit telt als gevonden."""
+    found = [hit_ids(h) for h in hits]
+    recall = len(set(expected) & set().union(*found)) / len(expected)
+    rr = next((1.0 / (i + 1) for i, ids in enumerate(found) if ids & set(expected)), 0.0)
+    return recall, rr
+
+
+def run_mode(mode, questions, search_kwargs, repeat, use_filter):
+    latencies, per_question = [], []
+    t_start = time.perf_counter()
+    for q in questions:
+        pgs_filter = q.get("pgs") if use_filter else None
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            hits = search_measures(q["question"], pgs_filter=pgs_filter, mode=mode, **search_kwargs)
+            latencies.append((time.perf_counter() - t0) * 1000)
+        recall, rr = score_hits(hits, q["expected"])
+        per_question.append({"id": q["id"], "recall": recall, "rr": rr,
+                             "top": [h["id"] for h in hits[:5]]})
+    total = time.perf_counter() - t_start
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        "p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99),
+        "qps": len(latencies) / total,
+        "recall_at_k": float(np.mean([r["recall"] for r in per_question])),
+        "mrr": float(np.mean([r["rr"] for r in per_question])),
+        "per_question": per_question,
+    }
+
+
+def reduction_tradeoff(embs, dims, k, n_queries=EVAL_QUERIES):
+    """
+    Recall@k en indexgrootte van een flat-ip index per reductiemethode en
+    doeldimensie, t.o.v. exact zoeken op de volle vectoren (zie evaluate_index).
+    """
+    embs = np.ascontiguousarray(embs, dtype="float32")
+    full = faiss.IndexFlatIP(embs.shape[1])
+    full.add(embs)
+    rows = [{"reduce": None, "dim": embs.shape[1], "bytes": len(faiss.serialize_index(full)), "recall": 1.0}]
+    for method in REDUCE_METHODS:
+        for dim in sorted(d for d in dims if d < embs.shape[1]):
+            index = build_ann_index("flat-ip", embs, reduce=method, reduce_dim=dim)
+            rep = evaluate_index(index, embs, k=k, n_queries=n_queries)
+            rows.append({"reduce": method, "dim": dim, "bytes": len(faiss.serialize_index(index)),
+                         "recall": rep["recall"], "p50_ms": rep["p50_ms"]})
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", default=BENCH_QUESTIONS_FILE)
+    parser.add_argument("--modes", nargs="+", default=SEARCH_MODES, help="zoekmodes (zie RAG/search.SEARCH_MODES)")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--prefetch-k", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3, help="herhalingen per vraag voor de latency")
+    parser.add_argument("--filter", action="store_true", help="zoek met het PGS-filter van elke vraag")
+    parser.add_argument("--query-cache", action="store_true", help="gebruik de query-embedding cache")
+    parser.add_argument("--reduce-dims", type=int, nargs="*", default=[],
+                        help="doeldimensies voor het recall-vs-grootte rapport van PCA / truncatie")
+    parser.add_argument("--out", default=BENCH_RESULTS_DIR)
+    args = parser.parse_args()
+
+    with open(args.questions, encoding="utf-8") as f:
+        qset = json.load(f)
+    questions = qset["questions"]
+
+    t0 = time.perf_counter()
+    build = Build(current_build_dir())
+    store, index, doc_embs, bm25, facets = build.store, build.index, build.doc_embs, build.bm25, build.facets
+    local_model = load_local_model()
+    load_s = time.perf_counter() - t0
+    print(f"📦 Artefacten geladen in {load_s:.1f} s ({index.ntotal} vectoren, {len(bm25.vocab)} BM25-termen)")
+
+    search_kwargs = dict(
+        local_model=local_model, index=index, store=store,
+        embed_func=embed_local if args.query_cache else embed_uncached,
+        k=args.k, prefetch_k=args.prefetch_k, doc_embs=doc_embs, bm25=bm25, facets=facets,
+    )
+    # Warm-up: eerste model-aanroep en page-cache niet meetellen
+    search_measures(questions[0]["question"], mode="FAISS", **search_kwargs)
+
+    results = {}
+    for mode in args.modes:
+        res = run_mode(mode, questions, search_kwargs, args.repeat, args.filter)
+        results[mode] = res
+        print(f"🔎 {mode:32s} p50 {res['p50_ms']:7.2f} ms | p95 {res['p95_ms']:7.2f} ms | "
+              f"p99 {res['p99_ms']:7.2f} ms | {res['qps']:7.1f} q/s | "
+              f"recall@{args.k} {res['recall_at_k']:.3f} | MRR {res['mrr']:.3f}")
+
+    reduction = []
+    if args.reduce_dims:
+        if doc_embs is None:
+            raise SystemExit(f"--reduce-dims heeft {artifact(build.dir, 'embeddings')} nodig, draai build_index.py opnieuw")
+        reduction = reduction_tradeoff(doc_embs, args.reduce_dims, args.k)
+        for r in reduction:
+            print(f"📐 {r['reduce'] or 'volledig':8s} {r['dim']:4d} dim | {r['bytes'] / 1e6:7.1f} MB | "
+                  f"recall@{args.k} {r['recall']:.3f}")
+
+    report = {
+        "benchmark_version": 1,
+        "questions_file": args.questions,
+        "questions_version": qset.get("version"),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "model": EMBEDDING_MODEL,
+        "build_id": build.build_id,
+        "index_info": load_index_info(artifact(build.dir, "index_info")),
+        "index_bytes": os.path.getsize(artifact(build.dir, "index")),
+        "n_vectors": int(index.ntotal),
+        "dim": int(index.d),
+        "params": {"k": args.k, "prefetch_k": args.prefetch_k, "repeat": args.repeat,
+                   "filter": args.filter, "query_cache": args.query_cache},
+        "load_seconds": load_s,
+        "peak_rss_mb": peak_rss_mb(),
+        "modes": results,
+        "reduction": reduction,
+    }
+    os.makedirs(args.out, exist_ok=True)
+    out_file = os.path.join(args.out, f"bench_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(out_file, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"💾 Piek-RSS {report['peak_rss_mb'] or 0:.0f} MB → {out_file}")
@@ -0,0 +1,219 @@
+# ------------------------------------------------------------------------------
+# benchmark_parsing.py
+#
+# Meet de parse-snelheid van de HTML-backends (RAG/htmlscraper.py) op de al
+# gedownloade publicaties in OUTPUT_DIR: per bestand en per backend de beste
+# tijd over een aantal herhalingen, plus een controle dat alle backends exact
+# dezelfde docs opleveren. Met --parts pdf hetzelfde voor de PDF-backends
+# (RAG/pdfscraper.py), waarbij de tabellen gelijk moeten zijn. Daarnaast de encoding-reparatie (RAG/encoding.py)
+# tegen de oude implementatie, over alle tekst-nodes van de HTML-bestanden
+# (en met --pdf ook de paginateksten van de PDF's). Schrijft het rapport als
+# JSON naast de resultaten van benchmark.py. De encoding-benchmark meet ook de
+# oude tweede pass (fix_json_encoding over alle geparste docs), die bij het
+# inlezen is vervallen.
+#
+#   python V3/benchmark_parsing.py
+#   python V3/benchmark_parsing.py --backends lxml --repeat 5
+#   python V3/benchmark_parsing.py --parts encoding --pdf
+#   python V3/benchmark_parsing.py --parts pdf --repeat 1
+# ------------------------------------------------------------------------------
+import os, glob, json, time, argparse
+import lxml.html
+from parameters import OUTPUT_DIR, BENCH_RESULTS_DIR
+from RAG.htmlscraper import HTML_BACKENDS, parse_html_file, decode_html
+from RAG.pdfscraper import PDF_BACKENDS, iter_pdf_pages, pdfium
+from RAG.encoding import fix_encoding, MOJIBAKE_RE
+from RAG.utils import peak_rss_mb
+
+PARTS = ("html", "encoding", "pdf")
+
+
+def time_backend(path, backend, repeat):
+    """(beste tijd in s, docs) van parse_html_file met deze backend."""
+    best, docs = None, None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        docs = parse_html_file(path, "", "", backend=backend)
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return best, docs
+
+
+def time_pdf_backend(path, backend, repeat):
+    """(beste tijd in s, [(tekst, tabellen) per pagina]) van iter_pdf_pages met deze backend."""
+    best, pages = None, None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        pages = list(iter_pdf_pages(path, with_tables=True, backend=backend))
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return best, pages
+
+
+def legacy_fix_encoding(s):
+    """De oude fix_encoding (altijd een round-trip, tien losse replaces): referentie voor de benchmark."""
+    if not isinstance(s, str):
+        return s
+    try:
+        s = s.encode("latin1").decode("utf-8")
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        pass
+    for bad, good in {"\uf02d": "-", "•": "-", "–": "-", "—": "-", "“": "\"", "”": "\"",
+                      "’": "'", "´": "'", "•": "-", "·": "-"}.items():
+        s = s.replace(bad, good)
+    return s
+
+
+def legacy_fix_json_encoding(obj):
+    """De oude tweede pass van de scrapers: legacy_fix_encoding recursief over de geparste docs."""
+    if isinstance(obj, dict):
+        return {k: legacy_fix_json_encoding(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [legacy_fix_json_encoding(x) for x in obj]
+    elif isinstance(obj, str):
+        return legacy_fix_encoding(obj)
+    else:
+        return obj
+
+
+def best_time(func, repeat):
+    """(beste tijd in s, uitkomst) van func() over een aantal herhalingen."""
+    best, out = None, None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = func()
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return best, out
+
+
+def corpus_strings(files, pdfs=()):
+    """Alle tekst-nodes van de HTML-bestanden en de paginateksten van de PDF's (ongerepareerd)."""
+    strings = []
+    for path in files:
+        with open(path, "rb") as f:
+            root = lxml.html.document_fromstring(decode_html(f.read()))
+        strings.extend(str(t) for t in root.xpath("//text()"))
+    for path in pdfs:
+        try:
+            strings.extend(text for text, _ in iter_pdf_pages(path, with_tables=False))
+        except Exception as e:
+            print(f"⚠️ {path} overgeslagen: {e}")
+    return strings
+
+
+def encoding_benchmark(strings, docs, repeat):
+    """Beste tijd van oud en nieuw over dezelfde strings, plus een controle dat de uitkomst gelijk is.
+
+    Oud = de repair per string plus de vervallen pass over de geparste docs
+    (doc_pass_seconds); nieuw = alleen de repair per string.
+    """
+    result = {"strings": len(strings), "chars": sum(len(s) for s in strings),
+              "round_trips": sum(1 for s in strings if not s.isascii() and MOJIBAKE_RE.search(s))}
+    for name, func in (("legacy", legacy_fix_encoding), ("translate", fix_encoding)):
+        result[f"{name}_seconds"], result[f"{name}_fixed"] = best_time(lambda: [func(s) for s in strings], repeat)
+    result["docs"] = len(docs)
+    result["doc_pass_seconds"], walked = best_time(lambda: [legacy_fix_json_encoding(d) for d in docs], repeat)
+    result["doc_pass_changed"] = sum(a != b for a, b in zip(docs, walked))
+    result["changed"] = sum(a != b for a, b in zip(strings, result["translate_fixed"]))
+    result["mismatches"] = sum(a != b for a, b in zip(result.pop("legacy_fixed"), result.pop("translate_fixed")))
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default=OUTPUT_DIR, help="map met de gedownloade publicaties")
+    parser.add_argument("--backends", nargs="+", default=list(HTML_BACKENDS), choices=HTML_BACKENDS)
+    parser.add_argument("--repeat", type=int, default=3, help="herhalingen per bestand (de beste telt)")
+    parser.add_argument("--parts", nargs="+", default=["html", "encoding"], choices=PARTS,
+                        help="pdf (alle PDF-pagina's met tabellen, traag) alleen op verzoek")
+    parser.add_argument("--pdf", action="store_true", help="neem ook de PDF-paginateksten mee in de encoding-benchmark")
+    parser.add_argument("--out", default=BENCH_RESULTS_DIR)
+    args = parser.parse_args()
+
+    files = sorted(glob.glob(os.path.join(args.data, "*.html")))
+    if not files:
+        raise SystemExit(f"Geen HTML-bestanden in {args.data}")
+
+    per_file = []
+    totals = {backend: 0.0 for backend in args.backends}
+    mismatches = []
+    for path in files if "html" in args.parts else []:
+        row = {"file": os.path.basename(path), "bytes": os.path.getsize(path), "seconds": {}}
+        reference = None
+        for backend in args.backends:
+            seconds, docs = time_backend(path, backend, args.repeat)
+            row["seconds"][backend] = seconds
+            row["docs"] = len(docs)
+            totals[backend] += seconds
+            if reference is None:
+                reference = docs
+            elif docs != reference:
+                mismatches.append({"file": row["file"], "backend": backend})
+        per_file.append(row)
+        timings = " | ".join(f"{b} {s:6.2f} s" for b, s in row["seconds"].items())
+        print(f"📄 {row['file']:14s} {row['bytes'] / 1e6:5.1f} MB {row['docs']:5d} docs | {timings}")
+
+    total_mb = sum(r["bytes"] for r in per_file) / 1e6
+    for backend, seconds in totals.items() if per_file else []:
+        print(f"⏱️  {backend:5s} {seconds:7.2f} s totaal ({total_mb / seconds:5.1f} MB/s)")
+    if mismatches:
+        print(f"⚠️ Backends geven andere docs voor: {', '.join(m['file'] for m in mismatches)}")
+
+    pdf_files = []
+    pdf_backends = [b for b in PDF_BACKENDS if b != "pypdfium2" or pdfium is not None]
+    for path in sorted(glob.glob(os.path.join(args.data, "*.pdf"))) if "pdf" in args.parts else []:
+        row = {"file": os.path.basename(path), "bytes": os.path.getsize(path), "seconds": {},
+               "table_mismatches": []}
+        reference = None
+        for backend in pdf_backends:
+            seconds, pages = time_pdf_backend(path, backend, args.repeat)
+            row["seconds"][backend] = seconds
+            row["pages"] = len(pages)
+            tables = [t for _, t in pages]
+            if reference is None:
+                reference = tables
+                row["pages_with_tables"] = sum(1 for t in tables if t)
+            elif tables != reference:
+                # tekst verschilt per backend (andere extractie), tabellen horen gelijk te zijn
+                row["table_mismatches"].append(backend)
+        pdf_files.append(row)
+        timings = " | ".join(f"{b} {s:6.2f} s" for b, s in row["seconds"].items())
+        print(f"📕 {row['file']:14s} {row['pages']:4d} pagina's ({row['pages_with_tables']} met tabellen) | {timings}")
+    for backend in pdf_backends if pdf_files else []:
+        print(f"⏱️  {backend:10s} {sum(r['seconds'][backend] for r in pdf_files):7.2f} s totaal")
+    if any(r["table_mismatches"] for r in pdf_files):
+        print(f"⚠️ PDF-backends geven andere tabellen voor: "
+              f"{', '.join(r['file'] for r in pdf_files if r['table_mismatches'])}")
+
+    encoding = None
+    if "encoding" in args.parts:
+        pdfs = sorted(glob.glob(os.path.join(args.data, "*.pdf"))) if args.pdf else []
+        docs = [doc for path in files for doc in parse_html_file(path, "", "", backend=args.backends[0])]
+        encoding = encoding_benchmark(corpus_strings(files, pdfs), docs, args.repeat)
+        old = encoding["legacy_seconds"] + encoding["doc_pass_seconds"]
+        print(f"🔤 encoding: {encoding['strings']} strings ({encoding['chars'] / 1e6:.1f} M tekens), "
+              f"{encoding['round_trips']} round-trips, {encoding['changed']} gewijzigd | "
+              f"oud {encoding['legacy_seconds']:.3f} s + doc-pass {encoding['doc_pass_seconds']:.3f} s "
+              f"({encoding['docs']} docs, {encoding['doc_pass_changed']} gewijzigd) = {old:.3f} s | "
+              f"nieuw {encoding['translate_seconds']:.3f} s")
+        if encoding["mismatches"]:
+            print(f"⚠️ Nieuwe encoding-fix wijkt af van de oude bij {encoding['mismatches']} strings")
+
+    report = {
+        "benchmark_version": 3,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "data": args.data,
+        "params": {"backends": args.backends, "repeat": args.repeat, "parts": args.parts, "pdf": args.pdf},
+        "files": per_file,
+        "total_seconds": totals if per_file else {},
+        "mismatches": mismatches,
+        "pdf_files": pdf_files,
+        "encoding": encoding,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    os.makedirs(args.out, exist_ok=True)
+    out_file = os.path.join(args.out, f"parse_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(out_file, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"💾 → {out_file}")
@@ -3,117 +3,160 @@
 
 import os, json, numpy as np, faiss
 from sentence_transformers import SentenceTransformer
-from parameters import DOCS_FILE, META_FILE, FAISS_INDEX_FILE, EMBEDDING_MODEL, OUTPUT_DIR, VERSION
-from rank_bm25 import BM25Okapi
+from parameters import DOCS_FILE, EMBEDDING_MODEL, VERSION
+from parameters import DEDUP_THRESHOLD, INDEX_TYPE, INDEX_STORAGE, INDEX_REDUCE, INDEX_REDUCE_DIM, EVAL_K, EVAL_QUERIES, EMBED_BATCH_SIZE, EMBED_WORKERS, EMBED_CACHE_DIR
+from RAG.bm25 import BM25Index
+from RAG.analyzer import ANALYZER_VERSION
+from RAG.ann import INDEX_TYPES, STORAGE_TYPES, SQ_INDEX_TYPES, REDUCE_METHODS, build_ann_index, index_info, save_index_info, evaluate_index
+from RAG.incremental import chunk_hash, plan_reuse, load_chunk_manifest, save_chunk_manifest
+from RAG.embed_corpus import encode_into, resolve_workers
+from RAG.embedding_cache import EmbeddingCache
+from RAG.docstore import write_docstore
+from RAG.doctext import text_for_indexing
+from RAG.dedup import dedup_docs, save_aliases
+from RAG.builds import artifact, current_build_dir, new_build_dir, carry_over, write_manifest, publish
 
 
 # Laad documenten
 def load_docs(path=DOCS_FILE):
     with open(path, encoding="utf-8") as f:
         return json.load(f)
-    
-def normalize_tables(tables):
-    """Zet tabellen altijd om naar strings (1 regel per rij)."""
-    norm = []
-    for row in tables:
-        if isinstance(row, str):
-            norm.append(row)
-
-        elif isinstance(row, (list, tuple)):
-            # bv. ["ADR 2023", "rijksoverheid.nl"]
-            parts = []
-            for cell in row:
-                if isinstance(cell, dict):
-                    txt = cell.get("text", "")
-                    url = cell.get("url")
-                    if url:
-                        parts.append(f"{txt} ({url})")
-                    else:
-                        parts.append(txt)
-                else:
-                    parts.append(str(cell))
-            norm.append("; ".join(parts))
-
-        elif isinstance(row, dict):
-            # losse dict als cell
-            txt = row.get("text", "")
-            url = row.get("url")
-            norm.append(f"{txt} ({url})" if url else txt)
-
-        else:
-            norm.append(str(row))
-    return norm
-
-
-
-def text_for_indexing(doc):
-    parts = [
-        doc.get("id",""),
-        doc.get("title",""),
-        doc.get("text",""),
-        "\n".join(doc.get("items",[])),
-        "\n".join(normalize_tables(doc.get("tables",[]))),
-    ]
-    if doc.get("type") == "measure":
-        parts.append("\n".join(doc.get("grondslag", [])))
-        parts.append("\n".join(d["id"] + " " + d["title"] for d in doc.get("doelen", [])))
-        parts.append("\n".join(s["id"] + " " + s["title"] for s in doc.get("scenarios", [])))
-    return "\n".join(p for p in parts if p)
-
-
-
-
-def save_metadata(docs,path = META_FILE):
-    meta = [
-        {
-            "id": d["id"],
-            "pgs": d.get("pgs"),
-            "type": d.get("type"),
-            "title": d.get("title"),
-            "source": d.get("source"),    
-        }
-        for d in docs
-    ]
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(meta, f, ensure_ascii=False, indent=2)
+
 
 # -------------------------------
 # FAISS indexing
 # -------------------------------
-def build_faiss_index(docs,texts):
-    
-    model = SentenceTransformer(EMBEDDING_MODEL)
-    embs = model.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
-
-    dim = embs.shape[1]
-    index = faiss.IndexFlatL2(dim)
-    index.add(embs)
-
-    faiss.write_index(index, FAISS_INDEX_FILE)
-    save_metadata(docs, META_FILE)
-
-    print(f"✅ FAISS: Indexed {len(docs)} chunks with {EMBEDDING_MODEL} → {FAISS_INDEX_FILE}")
+def build_faiss_index(docs,texts, index_type=INDEX_TYPE, hashes=None, previous=None,
+                      batch_size=EMBED_BATCH_SIZE, workers=EMBED_WORKERS, storage=INDEX_STORAGE,
+                      reduce=INDEX_REDUCE, reduce_dim=INDEX_REDUCE_DIM, out_dir=VERSION, prev_dir=VERSION):
+    """
+    Bouw de FAISS index. Met `previous` (het faiss-deel van de vorige
+    chunk-manifest) worden vectoren van ongewijzigde chunks (zelfde
+    content-hash, zelfde model) uit embeddings.npy hergebruikt en worden
+    alleen nieuwe/gewijzigde chunks opgezocht in de embedding-cache
+    (EMBED_CACHE_DIR, sleutel model + content-hash). Wat daar ook ontbreekt
+    wordt per unieke tekst één keer ge-embed, op lengte gesorteerd en
+    verdeeld over `workers` processen (0 = alle cores).
+    `storage` (float32 / float16 / sq8) bepaalt hoe de index de vectoren
+    opslaat; het rapport toont de grootte en het recall-verlies t.o.v. float32.
+    Met `reduce` (pca / truncate) slaat de index `reduce_dim`-dimensionale
+    vectoren op; embeddings.npy blijft op volle dimensie. De vectoren gaan
+    direct naar embeddings.npy (memmap) terwijl de buckets binnenkomen; de
+    index wordt daarna in één keer in rijvolgorde gevuld.
+    De vorige build wordt uit `prev_dir` gelezen, de nieuwe naar `out_dir` geschreven.
+    """
+    hashes = hashes or [chunk_hash(t) for t in texts]
+    prev_embs_file, prev_index_file = artifact(prev_dir, "embeddings"), artifact(prev_dir, "index")
+    index_file, embs_file = artifact(out_dir, "index"), artifact(out_dir, "embeddings")
+    old_embs = None
+    if previous and previous.get("model") == EMBEDDING_MODEL and os.path.exists(prev_embs_file):
+        # Zelfde bestand als de uitvoer: eerst inlezen, het wordt hieronder overschreven
+        same_file = os.path.abspath(prev_embs_file) == os.path.abspath(embs_file)
+        old_embs = np.load(prev_embs_file, mmap_mode=None if same_file else "r")
+        if len(old_embs) != len(previous["hashes"]):
+            old_embs = None   # manifest en embeddings.npy lopen niet gelijk → alles opnieuw
+    reuse, removed = plan_reuse(previous["hashes"] if old_embs is not None else [], hashes)
+    kept, todo = np.flatnonzero(reuse >= 0), np.flatnonzero(reuse < 0)
+
+    cache = EmbeddingCache(EMBEDDING_MODEL) if EMBED_CACHE_DIR else None
+    cache_rows = cache.lookup([hashes[i] for i in todo]) if cache is not None else np.full(len(todo), -1)
+    cached, missing = todo[cache_rows >= 0], todo[cache_rows < 0]
+
+    # Identieke teksten (bv. PDF-pagina's en HTML-secties) maar één keer embedden
+    first = {}
+    for i in missing:
+        first.setdefault(hashes[i], i)
+    unique = np.array(list(first.values()), dtype="int64")
+
+    model = SentenceTransformer(EMBEDDING_MODEL) if len(unique) else None
+    if old_embs is not None:
+        dim = old_embs.shape[1]
+    elif cache is not None and cache.dim:
+        dim = cache.dim
+    else:
+        dim = model.get_sentence_embedding_dimension()
+
+    # Buckets komen op lengte binnen, FAISS nummert rijen in volgorde van add():
+    # de index kan pas gevuld worden als alle rijen er zijn. Tot dan staan de
+    # vectoren in embeddings.npy (page cache) i.p.v. in een eigen kopie in RAM.
+    embs = np.lib.format.open_memmap(embs_file, mode="w+", dtype="float32", shape=(len(texts), dim))
+    if len(kept):
+        embs[kept] = old_embs[reuse[kept]]
+    if len(cached):
+        embs[cached] = cache.get(cache_rows[cache_rows >= 0])
+    if len(unique):
+        # Buckets komen op lengte binnen; elke vector gaat direct naar zijn eigen rij
+        rate = encode_into(model, [texts[i] for i in unique], embs, rows=unique,
+                           batch_size=batch_size, workers=workers)
+        print(f"⚡ {len(unique)} chunks ge-embed: {rate:.1f} embeddings/s "
+              f"({resolve_workers(workers)} workers, batch {batch_size})")
+        if cache is not None:
+            cache.add([hashes[i] for i in unique], embs[unique])
+        embs[missing] = embs[[first[hashes[i]] for i in missing]]
+    print(f"♻️  FAISS: {len(kept)} chunks hergebruikt, {len(cached)} uit de embedding-cache, "
+          f"{len(unique)} ge-embed ({len(missing) - len(unique)} duplicaten), {removed} verwijderd")
+
+    # Training van de vorige index hergebruiken als type, opslag en dimensie gelijk zijn
+    prev_index = None
+    if (old_embs is not None and previous.get("index_type") == index_type
+            and previous.get("storage", "float32") == storage
+            and previous.get("reduce") == reduce and (not reduce or previous.get("reduce_dim") == reduce_dim)
+            and os.path.exists(prev_index_file)):
+        prev_index = faiss.read_index(prev_index_file)
+        if prev_index.d != dim:
+            prev_index = None
+    # Vectoren ook los bewaren (zelfde volgorde als docs.parquet), voor hybrid rerank zonder opnieuw embedden
+    embs.flush()
+    index = build_ann_index(index_type, embs, previous=prev_index, storage=storage, reduce=reduce, reduce_dim=reduce_dim)
+    faiss.write_index(index, index_file)
+
+    print(f"✅ FAISS ({index_type}, {storage}): Indexed {len(docs)} chunks with {EMBEDDING_MODEL} → {index_file}")
+
+    # Grootte en recall/latency t.o.v. exact zoeken op float32
+    rep = evaluate_index(index, embs, k=EVAL_K, n_queries=EVAL_QUERIES)
+    index_bytes = os.path.getsize(index_file)
+    reduced = f", {reduce} {dim} → {reduce_dim} dimensies" if reduce else ""
+    print(f"📦 index {index_bytes / 1e6:.1f} MB (float32 vectoren: {embs.nbytes / 1e6:.1f} MB{reduced})")
+    print(f"📊 recall@{rep['k']}: {rep['recall']:.3f} (verlies t.o.v. float32 exact: {1 - rep['recall']:.3f}) | "
+          f"p50 {rep['p50_ms']:.2f} ms, p95 {rep['p95_ms']:.2f} ms "
+          f"(exact: p50 {rep['exact_p50_ms']:.2f} ms, p95 {rep['exact_p95_ms']:.2f} ms)")
+    save_index_info(index_info(index_type, index, storage=storage, model=EMBEDDING_MODEL,
+                               index_bytes=index_bytes, recall_at_k=rep["recall"], eval_k=rep["k"]),
+                    artifact(out_dir, "index_info"))
+    return {"model": EMBEDDING_MODEL, "index_type": index_type, "storage": storage,
+            "reduce": reduce, "reduce_dim": reduce_dim if reduce else None, "hashes": hashes}
 
 # -------------------------------
 # BM25 indexing
 # -------------------------------
-def build_bm25_index(docs):
-    
-    corpus = [d.get("text", "") for d in docs]
-    tokenized_corpus = [doc.split() for doc in corpus]
+def build_bm25_index(docs, texts=None, hashes=None, previous=None, out_dir=VERSION, prev_dir=VERSION):
+    """
+    Bouw de BM25 index over dezelfde teksten als FAISS (text_for_indexing:
+    titel + tekst + items), getokeniseerd met RAG/analyzer. Met `previous`
+    (het bm25-deel van de vorige chunk-manifest) worden de term-frequenties
+    van ongewijzigde chunks uit bm25.npz van `prev_dir` overgenomen en alleen
+    nieuwe/gewijzigde chunks getokeniseerd, zolang de analyzer-versie gelijk is.
+    """
+    prev_file, bm25_file = artifact(prev_dir, "bm25"), artifact(out_dir, "bm25")
+    corpus = texts or [text_for_indexing(d) for d in docs]
+    ids = [d["id"] for d in docs]
+    hashes = hashes or [chunk_hash(t) for t in corpus]
 
-    bm25 = BM25Okapi(tokenized_corpus)
+    # Term-statistieken en idf worden hier één keer berekend en binair opgeslagen
+    old = BM25Index.load(prev_file) if previous and os.path.exists(prev_file) else None
+    if old is not None and old.analyzer != ANALYZER_VERSION:
+        print(f"🔤 BM25: vorige index gebruikt analyzer-versie {old.analyzer}, alles opnieuw tokeniseren")
+        old = None
+    if old is not None:
+        reuse, removed = plan_reuse(previous["hashes"] if len(old.ids) == len(previous["hashes"]) else [], hashes)
+        bm25 = old.update(ids, corpus, reuse)
+        print(f"♻️  BM25: {int((reuse >= 0).sum())} chunks hergebruikt, {int((reuse < 0).sum())} getokeniseerd, {removed} verwijderd")
+    else:
+        bm25 = BM25Index.build(ids, corpus)
+    bm25.save(bm25_file)
 
-    bm25_meta = {
-        "ids": [d["id"] for d in docs],
-        "tokenized_corpus": tokenized_corpus,
-    }
-
-    bm25_file = os.path.join(OUTPUT_DIR, "bm25.json")
-    with open(bm25_file, "w", encoding="utf-8") as f:
-        json.dump(bm25_meta, f, ensure_ascii=False, indent=2)
-
-    print(f"✅ BM25: Indexed {len(docs)} docs → {bm25_file}")
+    print(f"✅ BM25: Indexed {len(docs)} docs ({len(bm25.vocab)} termen) → {bm25_file}")
+    return {"hashes": hashes, "analyzer": ANALYZER_VERSION}
 
 
 
@@ -131,13 +174,66 @@ if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument("--mode", choices=["faiss", "bm25", "all"], default="all")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default=INDEX_TYPE)
+    parser.add_argument("--storage", choices=list(STORAGE_TYPES), default=INDEX_STORAGE,
+                        help="vector-opslag in de index (float16/sq8 alleen voor flat-ip, ivf-flat, hnsw)")
+    parser.add_argument("--reduce", choices=REDUCE_METHODS, default=INDEX_REDUCE,
+                        help="vectoren in de index verkleinen met PCA of Matryoshka-truncatie")
+    parser.add_argument("--dim", type=int, default=INDEX_REDUCE_DIM, help="doeldimensie bij --reduce")
+    parser.add_argument("--full", action="store_true", help="alles opnieuw embedden/tokeniseren (geen incrementele build)")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=EMBED_WORKERS, help="embed-processen (0 = alle CPU-cores)")
+    parser.add_argument("--dedup-threshold", type=float, default=DEDUP_THRESHOLD,
+                        help="bijna-duplicaten vanaf deze gelijkenis als alias samenvoegen (0 = uit)")
     args = parser.parse_args()
-
-    docs = load_docs()
+    if args.storage != "float32" and args.index_type not in SQ_INDEX_TYPES:
+        parser.error(f"--storage {args.storage} kan alleen met --index-type {', '.join(SQ_INDEX_TYPES)}")
+    if args.reduce and args.index_type == "flat-l2":
+        parser.error("--reduce kan niet met --index-type flat-l2")
+
+    # Bijna-duplicaten (page-docs vs secties, gedeelde tekst tussen publicaties) vóór het embedden samenvoegen
+    docs, dedup = dedup_docs(load_docs(), threshold=args.dedup_threshold)
+    dedup_report = dedup.print_report()
     texts = [text_for_indexing(d) for d in docs]
-
+    hashes = [chunk_hash(t) for t in texts]
+
+    # Chunk-manifest van de vorige build: alleen nieuwe/gewijzigde chunks opnieuw verwerken
+    prev_dir = current_build_dir()
+    previous = load_chunk_manifest(artifact(prev_dir, "chunks"))
+    manifest = dict(previous)
+
+    # Wat niet opnieuw gebouwd wordt, wordt overgenomen, maar alleen als het bij dezelfde chunks hoort
+    carried = {"faiss": ("index", "index_info", "embeddings"), "bm25": ("bm25",)}
+    carried = {part: names for part, names in carried.items() if args.mode not in (part, "all")}
+    for part in carried:
+        if previous.get(part, {}).get("hashes") != hashes:
+            parser.error(f"de {part}-index van de vorige build hoort bij andere chunks; bouw met --mode all")
+
+    # Elke build in een eigen map; de app blijft de vorige gebruiken tot publish()
+    out_dir = new_build_dir()
+    print(f"🏗️  Build {out_dir} (vorige: {prev_dir})")
+    for names in carried.values():
+        carry_over(prev_dir, out_dir, names)
+
+    # Kolomgewijze chunk-store (vervangt meta.json); rij i == FAISS-rij i == BM25-rij i
+    write_docstore(docs, artifact(out_dir, "docstore"))
+    save_aliases(dedup.aliases, artifact(out_dir, "aliases"))
 
     if args.mode in ("faiss", "all"):
-        build_faiss_index(docs,texts)
+        manifest["faiss"] = build_faiss_index(docs,texts, index_type=args.index_type,
+                                              hashes=hashes, previous=None if args.full else previous.get("faiss"),
+                                              batch_size=args.batch_size, workers=args.workers,
+                                              storage=args.storage, reduce=args.reduce, reduce_dim=args.dim,
+                                              out_dir=out_dir, prev_dir=prev_dir)
     if args.mode in ("bm25", "all"):
-        build_bm25_index(docs)
\ No newline at end of file
+        manifest["bm25"] = build_bm25_index(docs, texts, hashes=hashes, previous=None if args.full else previous.get("bm25"),
+                                            out_dir=out_dir, prev_dir=prev_dir)
+    save_chunk_manifest(manifest, artifact(out_dir, "chunks"))
+
+    # Manifest (checksums, rijen, model, bouwtijd) en daarna atomair publiceren
+    rows = {name: len(docs) for name in ("index", "embeddings", "bm25", "docstore")}
+    write_manifest(out_dir, manifest["faiss"]["model"], rows, index_type=manifest["faiss"]["index_type"],
+                   storage=manifest["faiss"].get("storage", "float32"), reduce=manifest["faiss"].get("reduce"),
+                   dedup=dedup_report)
+    publish(out_dir)
+    print(f"🚀 Gepubliceerd: {out_dir}")
\ No newline at end of file
@@ -1,14 +1,21 @@
 import re
 import json
 import os
-import time
-import requests
+import asyncio
+import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import httpx
 from bs4 import BeautifulSoup
 
 from RAG.pdfscraper import scrape_pdf
 from RAG.htmlscraper import parse_html_file
+from RAG.fetcher import Fetcher, FetchState
+from RAG.builds import file_sha256
+from RAG.embed_corpus import resolve_workers
 from chunking import chunk_text
-from parameters import BASE, PGS_LINKS, OUTPUT_DIR
+from parameters import BASE, PGS_LINKS, OUTPUT_DIR, PARSED_DIR, PARSER_VERSION, PARSE_WORKERS, PDF_TEXT_BACKEND
 
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
@@ -17,93 +24,274 @@ def get_full_urls():
     return [BASE.rstrip("/") + link for link in PGS_LINKS]
 
 
-if __name__ == "__main__":
-    all_docs = []
+def pgs_label_from_url(url):
+    match = re.search(r"(pgs[\d\-]+)", url)
+    return match.group(1).upper() if match else "UNKNOWN"
 
-    for url in get_full_urls():
-        match = re.search(r"(pgs[\d\-]+)", url)
-        pgs_label = match.group(1).upper() if match else "UNKNOWN"
 
-        print(f"🔎 Visiting {pgs_label} ({url}) ...")
-        try:
-            resp = requests.get(url, timeout=20)
-            resp.raise_for_status()
-        except requests.exceptions.RequestException as e:
-            print(f"⚠️ Failed to fetch landing page {url}: {e}")
-            continue
+def find_publication_link(html):
+    """Url van de 'Meest actuele versie' op een PGS-landingspagina, of None."""
+    soup = BeautifulSoup(html, "lxml")
 
-        soup = BeautifulSoup(resp.text, "lxml")
-
-        # --- Step 1: detect 'Meest actuele versie' link ---
-        pub_url = None
-        for tag in soup.find_all(True):
-            if "meest actuele versie" in tag.get_text(strip=True).lower():
-                a = tag.find_parent("a", href=True)
-                if a:
-                    href = a["href"]
-                    if not href.startswith("http"):
-                        href = BASE.rstrip("/") + href
-                    pub_url = href
-                    break
+    # --- Step 1: detect 'Meest actuele versie' link ---
+    for tag in soup.find_all(True):
+        if "meest actuele versie" in tag.get_text(strip=True).lower():
+            a = tag.find_parent("a", href=True)
+            if a:
+                href = a["href"]
+                if not href.startswith("http"):
+                    href = BASE.rstrip("/") + href
+                return href
+    return None
+
+
+async def fetch_publication(fetcher, state, url):
+    """
+    Landingspagina → publicatie-url → bestand in OUTPUT_DIR; (pgs_label,
+    pub_url, pad) of None. Beide requests zijn conditioneel (ETag /
+    Last-Modified uit `state`): bij 304 blijft het bestand van de vorige keer staan.
+    """
+    pgs_label = pgs_label_from_url(url)
+    print(f"🔎 Visiting {pgs_label} ({url}) ...")
+    cached = state.get(url)
+    try:
+        html, entry = await fetcher.get_text(url, cached=cached if cached and cached.get("publication") else None)
+    except httpx.HTTPError as e:
+        print(f"⚠️ Failed to fetch landing page {url}: {e}")
+        return None
+
+    pub_url = find_publication_link(html) if html is not None else entry["publication"]
+    if not pub_url:
+        print(f"⚠️ No 'Meest actuele versie' found for {pgs_label}")
+        return None
+    state.set(url, {**entry, "publication": pub_url})
+
+    # --- Step 2: PDF of HTML downloaden (body gaat direct naar schijf) ---
+    ext = ".pdf" if pub_url.lower().endswith(".pdf") else ".html"
+    path = os.path.join(OUTPUT_DIR, f"{pgs_label}{ext}")
+    cached = state.get(pub_url)
+    try:
+        entry = await fetcher.download(pub_url, path, cached=cached if os.path.exists(path) else None)
+    except httpx.HTTPError as e:
+        print(f"⚠️ Failed to download {pub_url}: {e}")
+        return None
+    state.set(pub_url, entry)
+    status = "ongewijzigd" if not entry["changed"] else f"{entry['bytes'] / 1e6:.1f} MB"
+    print(f"  ➜ {pgs_label}: {pub_url} ({status})")
+    return pgs_label, pub_url, path
+
+
+async def _fetch_all(urls, state):
+    async with Fetcher() as fetcher:
+        return await asyncio.gather(*(fetch_publication(fetcher, state, url) for url in urls))
+
+
+def download_publications(urls=None):
+    """
+    Download alle publicaties tegelijk (per host begrensd, zie RAG/fetcher.py);
+    een volledige verversing duurt zo lang als de traagste download.
+    Geeft (pgs_label, pub_url, pad) in de volgorde van PGS_LINKS.
+    """
+    state = FetchState()
+    pubs = asyncio.run(_fetch_all(urls or get_full_urls(), state))
+    state.save()
+    return [pub for pub in pubs if pub]
+
+
+def parsed_cache_path(pgs_label):
+    return os.path.join(PARSED_DIR, f"{pgs_label}.json")
+
+
+def load_parsed(pgs_label, key):
+    """Geparste docs van de vorige keer als het bestand en de parser niet veranderd zijn, anders None."""
+    try:
+        with open(parsed_cache_path(pgs_label), encoding="utf-8") as f:
+            cached = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    return cached["docs"] if cached.get("key") == key else None
+
+
+def save_parsed(pgs_label, key, docs):
+    os.makedirs(PARSED_DIR, exist_ok=True)
+    path = parsed_cache_path(pgs_label)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"key": key, "docs": docs}, f, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+
+def parse_publication(pgs_label, pub_url, path):
+    """
+    Parse één gedownloade publicatie (PDF of HTML) → lijst ruwe docs. Is de
+    inhoud van het bestand (sha256), de url, PARSER_VERSION en (voor PDF's)
+    PDF_TEXT_BACKEND gelijk aan de vorige keer, dan komen de docs uit
+    PARSED_DIR en wordt er niet geparsed.
+    """
+    key = f"{file_sha256(path)}:{pub_url}:{PARSER_VERSION}"
+    if path.lower().endswith(".pdf"):
+        key += f":{PDF_TEXT_BACKEND}"
+    docs = load_parsed(pgs_label, key)
+    if docs is not None:
+        print(f"  ♻️  {pgs_label}: ongewijzigd, {len(docs)} docs van de vorige keer")
+        return docs
 
-        if not pub_url:
-            print(f"⚠️ No 'Meest actuele versie' found for {pgs_label}")
+    if path.lower().endswith(".pdf"):
+        print(f"  ➜ Scraping PDF {path}")
+        docs = scrape_pdf(path, pub_url, pgs_label, keep_pages=True)
+    else:
+        print(f"  ➜ Scraping HTML {path}")
+        docs = parse_html_file(path, pub_url, pgs_label)
+    save_parsed(pgs_label, key, docs)
+    return docs
+
+
+def local_publications():
+    """
+    De al gedownloade publicaties in OUTPUT_DIR als (pgs_label, pub_url, pad),
+    in de volgorde van PGS_LINKS. De url komt uit de fetch-state; zonder
+    state wordt de landingspagina als bron gebruikt.
+    """
+    state = FetchState()
+    landing = {pgs_label_from_url(url): url for url in get_full_urls()}
+    order = {label: i for i, label in enumerate(landing)}
+    pubs = []
+    for name in os.listdir(OUTPUT_DIR):
+        label, ext = os.path.splitext(name)
+        if ext.lower() not in (".pdf", ".html"):
             continue
+        entry = state.get(landing.get(label)) or {}
+        pub_url = entry.get("publication") or landing.get(label) or name
+        pubs.append((label, pub_url, os.path.join(OUTPUT_DIR, name)))
+    return sorted(pubs, key=lambda pub: (order.get(pub[0], len(order)), pub[0]))
 
-        # --- Step 2: PDF of HTML scraping ---
-        if pub_url.lower().endswith(".pdf"):
-            print(f"  ➜ Scraping PDF {pub_url}")
-            try:
-                resp = requests.get(pub_url, timeout=30)
-                resp.raise_for_status()
-            except requests.exceptions.RequestException as e:
-                print(f"⚠️ Failed to download PDF {pub_url}: {e}")
-                continue
 
-            pdf_path = os.path.join(OUTPUT_DIR, f"{pgs_label}.pdf")
-            with open(pdf_path, "wb") as f:
-                f.write(resp.content)
+def _parse_isolated(pub):
+    """parse_publication in een worker: (docs, None) of ([], foutmelding), zodat één kapot bestand de rest niet stopt."""
+    try:
+        return parse_publication(*pub), None
+    except Exception:
+        return [], traceback.format_exc(limit=3)
 
-            pdf_docs = scrape_pdf(pdf_path, pub_url, pgs_label, keep_pages=True)
-            all_docs.extend(pdf_docs)
 
-        else:
-            print(f"  ➜ Scraping HTML {pub_url}")
-            try:
-                resp = requests.get(pub_url, timeout=30)
-                resp.raise_for_status()
-            except requests.exceptions.RequestException as e:
-                print(f"⚠️ Failed to fetch HTML {pub_url}: {e}")
-                continue
+def _parse_alone(pub):
+    """Parse in een eigen proces: na een gecrashte pool is zo precies te zien welk bestand de oorzaak is."""
+    with ProcessPoolExecutor(max_workers=1) as solo:
+        try:
+            return solo.submit(_parse_isolated, pub).result()
+        except BrokenProcessPool as e:
+            return [], f"worker-proces gestopt: {e}"
 
-            html_path = os.path.join(OUTPUT_DIR, f"{pgs_label}.html")
-            with open(html_path, "w", encoding="utf-8") as f:
-                f.write(resp.text)
 
-            html_docs = parse_html_file(html_path, pub_url, pgs_label)
-            all_docs.extend(html_docs)
+def iter_parsed(pubs, workers=PARSE_WORKERS):
+    """
+    Parse publicaties over een process-pool (HTML en PDF parsen is CPU-werk)
+    en geef (pub, docs) in de volgorde van `pubs`, ongeacht welke eerst klaar
+    is. Er staan hooguit 2 * workers publicaties tegelijk uit. Een bestand
+    dat faalt levert geen docs op; stopt een worker-proces helemaal, dan
+    wordt de pool vervangen en worden de getroffen bestanden elk in een
+    eigen proces opnieuw geparsed.
+    """
+    workers = resolve_workers(workers)
+    if workers == 1:
+        for pub in pubs:
+            docs, error = _parse_isolated(pub)
+            if error:
+                print(f"⚠️ {pub[0]}: parsen mislukt ({pub[2]})\n{error}")
+            yield pub, docs
+        return
+
+    pubs = iter(pubs)
+    pool = ProcessPoolExecutor(max_workers=workers)
+    pending = deque()
+    try:
+        while True:
+            while len(pending) < 2 * workers:
+                pub = next(pubs, None)
+                if pub is None:
+                    break
+                try:
+                    future = pool.submit(_parse_isolated, pub)
+                except BrokenProcessPool:
+                    pool.shutdown(cancel_futures=True)
+                    pool = ProcessPoolExecutor(max_workers=workers)
+                    future = pool.submit(_parse_isolated, pub)
+                pending.append((pub, future))
+            if not pending:
+                return
+            pub, future = pending.popleft()
+            try:
+                docs, error = future.result()
+            except BrokenProcessPool:
+                docs, error = _parse_alone(pub)
+            if error:
+                print(f"⚠️ {pub[0]}: parsen mislukt ({pub[2]})\n{error}")
+            yield pub, docs
+    finally:
+        pool.shutdown(cancel_futures=True)
 
-        # vriendelijk voor de server
-        time.sleep(0.5)
 
-    print(f"📄 {len(all_docs)} raw docs scraped from {len(PGS_LINKS)} PGS pages")
+def iter_raw_docs(pubs=None, workers=PARSE_WORKERS):
+    """Ruwe docs per publicatie (standaard: eerst alles downloaden), geparsed over een process-pool."""
+    for _, docs in iter_parsed(download_publications() if pubs is None else pubs, workers):
+        yield from docs
 
-    # --- Step 3: Chunking ---
-    chunked_docs = []
-    for doc in all_docs:
+
+def iter_chunks(docs, max_tokens=400):
+    """--- Step 3: Chunking --- (doc-id krijgt een -c<n> suffix)"""
+    for doc in docs:
         if not doc.get("text"):
             continue
-        for i, chunk in enumerate(chunk_text(doc["text"], 400)):
-            chunked_docs.append({
+        for i, chunk in enumerate(chunk_text(doc["text"], max_tokens)):
+            yield {
                 **doc,
                 "id": f"{doc['id']}-c{i+1}",
                 "text": chunk
-            })
+            }
+
 
-    print(f"✂️  {len(chunked_docs)} chunks created")
+class DocsJsonWriter:
+    """Schrijft chunks één voor één als JSON-array (zelfde formaat als json.dump van de hele lijst)."""
+
+    def __init__(self, path):
+        self.rows = 0
+        self._f = open(path, "w", encoding="utf-8")
+        self._f.write("[")
+
+    def write(self, chunk):
+        self._f.write(",\n" if self.rows else "\n")
+        json.dump(chunk, self._f, ensure_ascii=False)
+        self.rows += 1
+
+    def tee(self, chunks):
+        """Schrijf elke chunk weg en geef hem door (streaming pipeline)."""
+        for chunk in chunks:
+            self.write(chunk)
+            yield chunk
+
+    def close(self):
+        self._f.write("\n]")
+        self._f.close()
+
+
+def write_docs_json(chunks, path):
+    """Schrijf een stroom chunks naar docs.json; geeft het aantal terug."""
+    writer = DocsJsonWriter(path)
+    for chunk in chunks:
+        writer.write(chunk)
+    writer.close()
+    return writer.rows
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--offline", action="store_true", help="niet downloaden, alleen de bestanden in OUTPUT_DIR parsen")
+    parser.add_argument("--workers", type=int, default=PARSE_WORKERS, help="parse-processen (0 = alle CPU-cores)")
+    args = parser.parse_args()
 
     docs_file = os.path.join(OUTPUT_DIR, "docs.json")
-    with open(docs_file, "w", encoding="utf-8") as f:
-        json.dump(chunked_docs, f, ensure_ascii=False, indent=2)
+    pubs = local_publications() if args.offline else None
+    # invoer voor build_index.py (→ docs.parquet); zie pipeline.py voor scrapen + indexeren in één stroom
+    n_chunks = write_docs_json(iter_chunks(iter_raw_docs(pubs, workers=args.workers)), docs_file)
 
-    print(f"✅ {docs_file} saved with {len(chunked_docs)} chunks")
+    print(f"✅ {docs_file} saved with {n_chunks} chunks from {len(PGS_LINKS)} PGS pages")
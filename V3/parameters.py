@@ -28,6 +28,21 @@ PGS_LINKS = [
     "/publicaties/pgs36/", "/publicaties/pgs37-1/", "/publicaties/pgs37-2/",
     "/publicaties/pgs38/", "/publicaties/pgs39/", "/publicaties/pgs40/",
 ]
+# Downloaden (RAG/fetcher.py): alle publicaties tegelijk, maar per host begrensd
+SCRAPE_CONCURRENCY = 4      # gelijktijdige requests per host (= keep-alive verbindingen)
+SCRAPE_RATE = 4.0           # max. nieuwe requests per seconde per host; None = geen limiet
+SCRAPE_RETRIES = 3          # extra pogingen bij time-outs, verbindingsfouten en 408/429/5xx
+SCRAPE_BACKOFF = 1.0        # wachttijd (s) vóór de eerste nieuwe poging, verdubbelt per poging
+SCRAPE_TIMEOUT = 30         # s per request
+# Conditionele requests: ETag / Last-Modified / content-hash per url, en de
+# geparste docs per publicatie (sleutel: hash van het bestand + PARSER_VERSION),
+# zodat ongewijzigde publicaties niet opnieuw geparsed worden.
+FETCH_STATE_FILE = VERSION + "/PGS_data/fetch_state.json"
+PARSED_DIR = VERSION + "/PGS_data/parsed"
+PARSE_WORKERS = 0           # processen voor het parsen van publicaties; 0 = alle CPU-cores, 1 = geen pool
+PARSER_VERSION = 4          # verhogen als pdfscraper/htmlscraper andere docs opleveren
+HTML_BACKEND = "lxml"       # "bs4" of "lxml" (zelfde docs, lxml is sneller); zie benchmark_parsing.py
+PDF_TEXT_BACKEND = "pdfplumber"  # "pypdfium2": snellere tekst, pdfplumber alleen nog voor tabellen
 # --- Index / Embedding instellingen ---
 
 # Kies hier het embedding model door een nummer te selecteren
@@ -87,7 +102,90 @@ EMBEDDING_MODEL = EMBEDDING_MODELS[EMBEDDING_MODEL_ID]
 
 FAISS_INDEX_FILE = VERSION + "/PGS.index"
 DOCS_FILE = VERSION +"/PGS_data/docs.json"
-META_FILE = VERSION + "/meta.json"
+DOCSTORE_FILE = VERSION + "/docs.parquet"      # chunks kolomgewijs, rij i == FAISS-rij i (vervangt meta.json)
+DOCSTORE_ROW_GROUP = 64                        # rijen per Parquet row group (kleiner = minder decoderen per hit)
+EMBEDDINGS_FILE = VERSION + "/embeddings.npy"   # document-vectors, zelfde volgorde als docs.parquet
+BM25_FILE = VERSION + "/bm25.npz"               # term-frequenties, doc-lengtes en idf (binair)
+INDEX_INFO_FILE = VERSION + "/index_info.json"  # index-type en zoekparameters van PGS.index
+ALIASES_FILE = VERSION + "/aliases.json"              # weggelaten bijna-duplicaten per canonieke chunk
+CHUNK_MANIFEST_FILE = VERSION + "/chunk_manifest.json"  # content-hashes per chunk, voor incrementele builds
+BENCH_QUESTIONS_FILE = VERSION + "/bench/questions_v1.json"   # vaste vragenset voor benchmark.py
+BENCH_RESULTS_DIR = VERSION + "/bench/results"
+QUERY_CACHE_FILE = VERSION + "/query_cache.npz"  # query-vectoren, blijft bewaard tussen herstarts (None = alleen in geheugen)
+
+# --- Geversioneerde builds (build_index.py / pipeline.py) ---
+# Elke build komt in een eigen map BUILDS_DIR/<bouwtijd>/ met de bestanden
+# hierboven (PGS.index, docs.parquet, ...) plus manifest.json; CURRENT_BUILD_FILE
+# wijst naar de actieve build en wordt atomair omgezet. Zonder pointer wordt
+# de oude indeling (bestanden direct in VERSION/) gebruikt.
+BUILDS_DIR = VERSION + "/builds"
+CURRENT_BUILD_FILE = VERSION + "/CURRENT"
+BUILD_KEEP = 3                  # aantal builds dat bewaard blijft (draaiende apps kunnen een oudere gebruiken)
+RELOAD_CHECK_SECONDS = 5        # app: zo vaak kijken of er een nieuwe build is gepubliceerd
+
+# --- Corpus-embedding bij het bouwen (RAG/embed_corpus.py) ---
+EMBED_BATCH_SIZE = 32       # teksten per model-batch
+EMBED_WORKERS = 0           # processen voor het embedden; 0 = alle CPU-cores, 1 = geen pool
+EMBED_BUCKET_SIZE = 512     # teksten per lengte-bucket (één bucket per worker per ronde)
+EMBED_CACHE_DIR = "embedding_cache"   # vector-cache per model (gedeeld door builds en versies); None = uit
+
+# --- Streaming scrape → index (pipeline.py) ---
+PIPELINE_BATCH = 256         # chunks per batch (embedden, index.add, docstore)
+PIPELINE_QUEUE_SIZE = 4      # max. batches in elke wachtrij tussen de stappen
+PIPELINE_TRAIN_SIZE = 50000  # trainingsvectoren voor ivf / pq / sq8 (steekproef uit embeddings.npy)
+
+# --- Near-duplicate detectie vóór het embedden (RAG/dedup.py) ---
+# Chunks waarvan de tekst (MinHash over woord-shingles) minstens DEDUP_THRESHOLD
+# overeenkomt met een eerdere chunk worden niet geïndexeerd maar als alias bij
+# die chunk bewaard (ALIASES_FILE). None = uit.
+DEDUP_THRESHOLD = 0.9
+DEDUP_NUM_PERM = 64         # MinHash-permutaties
+DEDUP_BANDS = 16            # LSH-banden (num_perm / bands rijen per band)
+DEDUP_SHINGLE = 3           # woorden per shingle
+
+# --- Query-embedding cache (RAG/embedding.py) ---
+QUERY_CACHE_SIZE = 10000        # max. aantal gecachte query-vectoren (LRU)
+QUERY_CACHE_SAVE_EVERY = 20     # naar schijf na elke N nieuwe vectoren (en bij afsluiten)
+
+# --- Fusie-zoekmode (BM25 + FAISS parallel) ---
+RRF_K = 60              # reciprocal-rank fusion: 1 / (RRF_K + rang)
+FUSION_ALPHA = 0.5      # score-fusie: gewicht van FAISS (BM25 krijgt 1 - alpha)
+FUSION_WORKERS = 4      # threads voor de parallelle BM25-zoekactie
+
+# --- FAISS index-type (build_index.py --index-type) ---
+# flat-l2  : exact, L2 (oude default)
+# flat-ip  : exact, inner product (= cosine, vectoren zijn genormaliseerd)
+# ivf-flat : clusters, alleen nprobe clusters doorzoeken
+# ivf-pq   : clusters + product quantization (veel kleiner, iets minder nauwkeurig)
+# hnsw     : graaf-index, snel en nauwkeurig, meer geheugen
+INDEX_TYPE = "flat-ip"
+# Opslag van de vectoren in flat-ip / ivf-flat / hnsw (build_index.py --storage):
+# float32 (exact), float16 (half zo groot) of sq8 (8-bit scalar quantization, kwart zo groot)
+INDEX_STORAGE = "float32"
+# Dimensiereductie vóór de index (build_index.py --reduce / --dim): "pca" (PCA op de
+# corpus-vectoren), "truncate" (eerste INDEX_REDUCE_DIM dimensies; alleen zinvol voor
+# Matryoshka-getrainde modellen) of None. De projectie zit in PGS.index zelf
+# (IndexPreTransform) en wordt bij het zoeken automatisch op de query toegepast.
+INDEX_REDUCE = None
+INDEX_REDUCE_DIM = 256
+INDEX_MMAP = True          # app: index read-only memory-mappen (gedeelde page cache tussen processen)
+IVF_NLIST = 0              # aantal clusters; 0 = automatisch (~4*sqrt(aantal chunks))
+IVF_NPROBE = 16            # aantal clusters dat per query doorzocht wordt
+PQ_M = 64                  # aantal PQ-subquantizers (wordt een deler van de dimensie)
+PQ_NBITS = 8
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 128
+# Gefilterd zoeken: tot zoveel matchende rijen een exacte scan over embeddings.npy,
+# daarboven de index zelf met een IDSelector (zelfde ANN/reductie/opslag als ongefilterd)
+FILTER_EXACT_MAX_ROWS = 2000
+EVAL_K = 10                # recall@k rapport na het bouwen
+EVAL_QUERIES = 200
+
+# --- BM25 instellingen (zelfde defaults als rank_bm25.BM25Okapi) ---
+BM25_K1 = 1.5
+BM25_B = 0.75
+BM25_EPSILON = 0.25
 
 
 # --- Prompt instellingen ---
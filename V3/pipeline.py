@@ -0,0 +1,223 @@
+# ------------------------------------------------------------------------------
+# pipeline.py
+#
+# Scrapen, chunken, embedden en indexeren in één stroom, met begrensd
+# geheugen: ruwe docs en chunks gaan via generators en begrensde wachtrijen
+# door de stappen, en elke batch van PIPELINE_BATCH chunks wordt ge-embed,
+# aan de FAISS index / BM25 / docstore toegevoegd en weggeschreven voordat
+# de volgende binnenkomt. Er staat nooit meer dan een paar batches tekst of
+# vectoren in het geheugen, hoe groot het corpus ook wordt.
+#
+# Schrijft dezelfde artefacten als main_scraper.py + build_index.py (ook
+# docs.json en de chunk-manifest, zodat latere builds incrementeel blijven),
+# in een nieuwe build-map die aan het eind gepubliceerd wordt.
+#
+#   python V3/pipeline.py
+#   python V3/pipeline.py --index-type ivf-flat --storage sq8
+#   python V3/pipeline.py --reduce pca --dim 128
+# ------------------------------------------------------------------------------
+import os, time, queue, shutil, threading, argparse
+import numpy as np
+import faiss
+from sentence_transformers import SentenceTransformer
+from parameters import (
+    DOCS_FILE, EMBEDDING_MODEL,
+    INDEX_TYPE, INDEX_STORAGE, INDEX_REDUCE, INDEX_REDUCE_DIM, EMBED_BATCH_SIZE, EMBED_CACHE_DIR,
+    PIPELINE_BATCH, PIPELINE_QUEUE_SIZE, PIPELINE_TRAIN_SIZE,
+)
+from main_scraper import iter_raw_docs, iter_chunks, DocsJsonWriter
+from RAG.doctext import text_for_indexing
+from RAG.ann import INDEX_TYPES, STORAGE_TYPES, SQ_INDEX_TYPES, REDUCE_METHODS, make_index, configure_index, index_info, save_index_info
+from RAG.bm25 import BM25Builder
+from RAG.analyzer import ANALYZER_VERSION
+from RAG.docstore import DocStoreWriter
+from RAG.dedup import Deduplicator, save_aliases
+from RAG.embedding_cache import EmbeddingCache
+from RAG.incremental import chunk_hash, save_chunk_manifest
+from RAG.utils import peak_rss_mb
+from RAG.builds import artifact, new_build_dir, write_manifest, publish
+
+_DONE = object()
+
+
+def background(iterable, maxsize):
+    """
+    Laat `iterable` in een eigen thread lopen en geef de items door via een
+    begrensde wachtrij: de producent wacht zodra er maxsize items klaarstaan.
+    Een exceptie in de producent komt bij de consument weer naar boven.
+    """
+    q = queue.Queue(maxsize=maxsize)
+
+    def produce():
+        try:
+            for item in iterable:
+                q.put(item)
+            q.put(_DONE)
+        except BaseException as e:
+            q.put(e)
+
+    threading.Thread(target=produce, daemon=True, name="pgs-pipeline").start()
+    while True:
+        item = q.get()
+        if item is _DONE:
+            return
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+
+
+def batched(iterable, n):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == n:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def embed_batches(batches, batch_size=EMBED_BATCH_SIZE):
+    """
+    Per batch chunks: (chunks, teksten, content-hashes, vectoren). Vectoren komen uit
+    de embedding-cache waar mogelijk; het model wordt pas geladen bij de
+    eerste tekst die echt ge-embed moet worden.
+    """
+    cache = EmbeddingCache(EMBEDDING_MODEL) if EMBED_CACHE_DIR else None
+    model = None
+    for batch in batches:
+        texts = [text_for_indexing(d) for d in batch]
+        hashes = [chunk_hash(t) for t in texts]
+        rows = cache.lookup(hashes) if cache is not None else np.full(len(hashes), -1)
+
+        first = {}
+        for i in np.flatnonzero(rows < 0):
+            first.setdefault(hashes[i], i)
+        if first and model is None:
+            model = SentenceTransformer(EMBEDDING_MODEL)
+
+        dim = cache.dim if cache is not None and cache.dim else model.get_sentence_embedding_dimension()
+        vecs = np.empty((len(batch), dim), dtype="float32")
+        if (rows >= 0).any():
+            vecs[rows >= 0] = cache.get(rows[rows >= 0])
+        if first:
+            unique = list(first.values())
+            vecs[unique] = model.encode([texts[i] for i in unique], batch_size=batch_size,
+                                        convert_to_numpy=True, normalize_embeddings=True)
+            if cache is not None:
+                cache.add([hashes[i] for i in unique], vecs[unique])
+            missing = np.flatnonzero(rows < 0)
+            vecs[missing] = vecs[[first[hashes[i]] for i in missing]]
+        yield batch, texts, hashes, vecs
+
+
+def finish_embeddings(raw_path, n, dim, path, block=PIPELINE_BATCH * 64):
+    """Zet het tijdens de stroom aangevulde ruwe float32-bestand om naar embeddings.npy (blok voor blok)."""
+    raw = np.memmap(raw_path, dtype="float32", mode="r", shape=(n, dim))
+    out = np.lib.format.open_memmap(path + ".tmp.npy", mode="w+", dtype="float32", shape=(n, dim))
+    for start in range(0, n, block):
+        out[start:start + block] = raw[start:start + block]
+    out.flush()
+    del raw, out
+    os.replace(path + ".tmp.npy", path)
+    os.remove(raw_path)
+    return np.load(path, mmap_mode="r")
+
+
+def train_and_fill(index_type, storage, embs, reduce=INDEX_REDUCE, reduce_dim=INDEX_REDUCE_DIM,
+                   block=PIPELINE_BATCH * 64, seed=0):
+    """Index die training nodig heeft (ivf / pq / sq8 / pca): trainen op een steekproef, dan blok voor blok vullen."""
+    index = make_index(index_type, embs.shape[1], len(embs), storage=storage, reduce=reduce, reduce_dim=reduce_dim)
+    rng = np.random.default_rng(seed)
+    sample = np.sort(rng.choice(len(embs), size=min(len(embs), PIPELINE_TRAIN_SIZE), replace=False))
+    index.train(np.asarray(embs[sample]))
+    for start in range(0, len(embs), block):
+        index.add(np.asarray(embs[start:start + block]))
+    return index
+
+
+def run_pipeline(raw_docs, index_type=INDEX_TYPE, storage=INDEX_STORAGE, batch=PIPELINE_BATCH,
+                 reduce=INDEX_REDUCE, reduce_dim=INDEX_REDUCE_DIM):
+    t0 = time.perf_counter()
+    docs_json = DocsJsonWriter(DOCS_FILE)
+    dedup = Deduplicator()
+    # docs.json krijgt alle chunks (invoer van build_index.py), de index alleen de canonieke
+    chunks = background(dedup.filter(docs_json.tee(iter_chunks(raw_docs))), maxsize=batch * PIPELINE_QUEUE_SIZE)
+    embedded = background(embed_batches(batched(chunks, batch)), maxsize=PIPELINE_QUEUE_SIZE)
+
+    out_dir = new_build_dir()
+    store = DocStoreWriter(artifact(out_dir, "docstore"))
+    bm25 = BM25Builder()
+    raw_path = artifact(out_dir, "embeddings") + ".raw"
+    ids, all_hashes = [], []
+    index, dim = None, None
+
+    with open(raw_path, "wb") as raw:
+        for docs, texts, hashes, vecs in embedded:
+            if index is None:
+                dim = vecs.shape[1]
+                index = make_index(index_type, dim, 0, storage=storage, reduce=reduce, reduce_dim=reduce_dim)
+            if index.is_trained:
+                index.add(vecs)                      # flat / hnsw: direct toevoegen
+            vecs.tofile(raw)                         # → embeddings.npy (en training van ivf / pq / sq8)
+            store.write(docs)
+            bm25.add(texts)
+            ids.extend(d["id"] for d in docs)
+            all_hashes.extend(hashes)
+            print(f"  … {len(ids)} chunks verwerkt", end="\r")
+
+    print()
+    docs_json.close()
+    store.close()
+    if not ids:
+        shutil.rmtree(out_dir, ignore_errors=True)
+        print("⚠️ Geen chunks gevonden, niets geïndexeerd")
+        return
+    print(f"✂️  {docs_json.rows} chunks → {DOCS_FILE}, {len(ids)} → {artifact(out_dir, 'docstore')}")
+    dedup_report = dedup.print_report()
+    save_aliases(dedup.aliases, artifact(out_dir, "aliases"))
+
+    bm25_index = bm25.finish(ids)
+    bm25_index.save(artifact(out_dir, "bm25"))
+    print(f"✅ BM25: Indexed {len(ids)} docs ({len(bm25_index.vocab)} termen) → {artifact(out_dir, 'bm25')}")
+
+    embs = finish_embeddings(raw_path, len(ids), dim, artifact(out_dir, "embeddings"))
+    if not index.is_trained:
+        index = train_and_fill(index_type, storage, embs, reduce=reduce, reduce_dim=reduce_dim)
+    info = index_info(index_type, index, storage=storage, model=EMBEDDING_MODEL)
+    configure_index(index, info)
+    index_file = artifact(out_dir, "index")
+    faiss.write_index(index, index_file)
+    info["index_bytes"] = os.path.getsize(index_file)
+    save_index_info(info, artifact(out_dir, "index_info"))
+    save_chunk_manifest({
+        "faiss": {"model": EMBEDDING_MODEL, "index_type": index_type, "storage": storage,
+                  "reduce": reduce, "reduce_dim": reduce_dim if reduce else None, "hashes": all_hashes},
+        "bm25": {"hashes": all_hashes, "analyzer": ANALYZER_VERSION},
+    }, artifact(out_dir, "chunks"))
+    rows = {name: len(ids) for name in ("index", "embeddings", "bm25", "docstore")}
+    write_manifest(out_dir, EMBEDDING_MODEL, rows, index_type=index_type, storage=storage, reduce=reduce,
+                   dedup=dedup_report)
+    publish(out_dir)
+
+    elapsed = time.perf_counter() - t0
+    print(f"✅ FAISS ({index_type}, {storage}): Indexed {len(ids)} chunks with {EMBEDDING_MODEL} → {index_file} "
+          f"({info['index_bytes'] / 1e6:.1f} MB)")
+    print(f"⏱️  {elapsed:.1f} s ({len(ids) / elapsed:.1f} chunks/s), piek-RSS {peak_rss_mb() or 0:.0f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default=INDEX_TYPE)
+    parser.add_argument("--storage", choices=list(STORAGE_TYPES), default=INDEX_STORAGE)
+    parser.add_argument("--reduce", choices=REDUCE_METHODS, default=INDEX_REDUCE)
+    parser.add_argument("--dim", type=int, default=INDEX_REDUCE_DIM, help="doeldimensie bij --reduce")
+    parser.add_argument("--batch", type=int, default=PIPELINE_BATCH, help="chunks per batch")
+    args = parser.parse_args()
+    if args.storage != "float32" and args.index_type not in SQ_INDEX_TYPES:
+        parser.error(f"--storage {args.storage} kan alleen met --index-type {', '.join(SQ_INDEX_TYPES)}")
+    if args.reduce and args.index_type == "flat-l2":
+        parser.error("--reduce kan niet met --index-type flat-l2")
+
+    run_pipeline(iter_raw_docs(), index_type=args.index_type, storage=args.storage, batch=args.batch,
+                 reduce=args.reduce, reduce_dim=args.dim)